@@ -0,0 +1,177 @@
+import csv
+import os
+import tempfile
+
+import numpy as np
+
+# Binary arrivals file:
+#   MAGIC (8 bytes), version (int64), number of arrivals n (int64),
+#   n timestamps (int64), n queue numbers (int32)
+MAGIC = b"SCHEDARR"
+VERSION = 1
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<i8"), ("count", "<i8")])
+TIMESTAMP_DTYPE = np.dtype("<i8")
+QUEUE_DTYPE = np.dtype("<i4")
+
+
+class Arrivals:
+    """
+    Sequence of arrivals [timestamp, queue number] stored in two int arrays
+    """
+    # Number of arrivals converted to python ints at once while iterating
+    CHUNK = 1 << 16
+
+    timestamps_: np.ndarray
+    queues_    : np.ndarray
+
+    def __init__(self, timestamps, queues):
+        self.timestamps_ = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        self.queues_ = np.asarray(queues, dtype=QUEUE_DTYPE)
+        assert len(self.timestamps_) == len(self.queues_)
+
+    def __len__(self):
+        return len(self.timestamps_)
+
+    def __getitem__(self, i) -> list:
+        return [int(self.timestamps_[i]), int(self.queues_[i])]
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, first: int):
+        """
+        Iterates over the arrivals starting with the index first, the
+        previous ones are not read
+        """
+        for start in range(first, len(self), Arrivals.CHUNK):
+            end = start + Arrivals.CHUNK
+            yield from zip(self.timestamps_[start:end].tolist(), self.queues_[start:end].tolist())
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self.timestamps_
+
+    @property
+    def queues(self) -> np.ndarray:
+        return self.queues_
+
+    @staticmethod
+    def open(filename: str):
+        """
+        Maps the binary arrivals file to memory, nothing is read in advance
+        """
+        header = np.fromfile(filename, dtype=HEADER_DTYPE, count=1)
+        assert len(header) == 1 and header["magic"][0] == MAGIC, filename + " is not an arrivals file"
+        version = int(header["version"][0])
+        assert version == VERSION, "Unsupported arrivals file version " + str(version)
+
+        count = int(header["count"][0])
+        if count == 0:
+            return Arrivals([], [])
+        offset = HEADER_DTYPE.itemsize
+        timestamps = np.memmap(filename, TIMESTAMP_DTYPE, 'r', offset, (count,))
+        queues = np.memmap(filename, QUEUE_DTYPE, 'r', offset + count * TIMESTAMP_DTYPE.itemsize, (count,))
+        return Arrivals(timestamps, queues)
+
+
+class ArrivalsWriter:
+    """
+    Writes binary arrivals file by chunks, memory usage does not depend
+    on the number of arrivals. Queue numbers are kept in a temporary file
+    until close
+    """
+    file_  : object
+    queues_: object
+    count_ : int
+
+    def __init__(self, filename: str):
+        self.file_ = open(filename, 'wb')
+        self.file_.write(bytes(HEADER_DTYPE.itemsize))
+        self.queues_ = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(filename)))
+        self.count_ = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, timestamps, queues):
+        """
+        Appends arrivals, timestamps must not decrease
+        """
+        timestamps = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        queues = np.asarray(queues, dtype=QUEUE_DTYPE)
+        assert len(timestamps) == len(queues)
+        self.file_.write(timestamps.tobytes())
+        self.queues_.write(queues.tobytes())
+        self.count_ += len(timestamps)
+
+    def close(self):
+        if self.file_.closed:
+            return
+        self.queues_.seek(0)
+        while True:
+            chunk = self.queues_.read(1 << 24)
+            if not chunk:
+                break
+            self.file_.write(chunk)
+        self.queues_.close()
+
+        header = np.array([(MAGIC, VERSION, self.count_)], dtype=HEADER_DTYPE)
+        self.file_.seek(0)
+        self.file_.write(header.tobytes())
+        self.file_.close()
+
+
+def read_csv(filename: str, chunk_size: int = Arrivals.CHUNK):
+    """
+    Yields (timestamps, queues) lists of the csv arrivals file by chunks
+    """
+    timestamps, queues = [], []
+    with open(filename, newline='\n') as file:
+        table = csv.reader(file, delimiter=',', quotechar='"')
+        for row in table:
+            timestamps.append(int(row[0]))
+            queues.append(int(row[1]))
+            if len(timestamps) == chunk_size:
+                yield timestamps, queues
+                timestamps, queues = [], []
+    if len(timestamps) != 0:
+        yield timestamps, queues
+
+
+class CsvArrivals:
+    """
+    Arrivals streamed from the csv file on each iteration, nothing is kept in memory
+    """
+    filename_: str
+
+    def __init__(self, filename: str):
+        self.filename_ = filename
+
+    def __iter__(self):
+        for timestamps, queues in read_csv(self.filename_):
+            yield from zip(timestamps, queues)
+
+
+def parse_lines(lines):
+    """
+    Yields (timestamp, queue) from lines "timestamp, queue", e.g. a file
+    or socket.makefile(). Empty lines are skipped
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        timestamp, queue = line.split(',')
+        yield int(timestamp), int(queue)
+
+
+def convert_csv(csv_filename: str, bin_filename: str):
+    """
+    Converts the csv arrivals file to the binary one
+    """
+    with ArrivalsWriter(bin_filename) as writer:
+        for timestamps, queues in read_csv(csv_filename):
+            writer.write(timestamps, queues)
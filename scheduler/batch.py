@@ -0,0 +1,117 @@
+import csv
+import random
+import time
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+
+from scheduler.input_parser import InputParser
+from scheduler.methods import METHODS
+from scheduler.offline import srpt_lower_bound, competitive_ratio
+from scheduler.solver import Solver
+
+# Parsed inputs of the batch, {file tag: InputParser}.
+# Set in each worker by init_worker_: with the fork start method workers
+# share the parent's copy, otherwise it is sent once per worker
+inputs_: dict = {}
+
+RESULT_COLUMNS = [
+    "algo_name", "file_tag", "seed", "servers", "time", "total_mean_queue",
+    "mean_queues", "max_queues", "utilisation", "switches", "competitive_ratio", "seconds"
+]
+
+
+def init_worker_(inputs: dict):
+    global inputs_
+    inputs_ = inputs
+
+
+def make_pool(inputs: dict, workers: int = None) -> ProcessPoolExecutor:
+    """
+    Returns process pool, which workers have access to inputs through inputs_
+    inputs - {file tag: InputParser}
+    workers - number of processes, all cores if None
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    return ProcessPoolExecutor(workers, context, init_worker_, (inputs,))
+
+
+def run_one_(algo_name: str, file_tag, seed: int, servers: int = 1) -> dict:
+    """
+    Runs algorithm on the parsed input of the file_tag and returns the row of the results table
+    """
+    start = time.perf_counter()
+    random.seed(seed)
+    ina = inputs_[file_tag]
+    sol = Solver(ina, METHODS[algo_name](ina), keep_distrib=False, servers=servers, coalesce=True)
+    sol.simulate()
+    res = sol.results()
+    return {
+        "algo_name": algo_name,
+        "file_tag": file_tag,
+        "seed": seed,
+        "servers": servers,
+        "time": res["time"],
+        "total_mean_queue": sum(res["mean_queues"]),
+        "mean_queues": " ".join("{:.4f}".format(q) for q in res["mean_queues"]),
+        "max_queues": " ".join(str(q) for q in res["max_queues"]),
+        "utilisation": res["utilisation"],
+        "switches": res["switches"],
+        "competitive_ratio": None,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def bound_one_(file_tag) -> float:
+    """
+    Returns the offline bound of one server for the parsed input of the file_tag
+    """
+    ina = inputs_[file_tag]
+    return srpt_lower_bound(ina.arrivals, ina.work_times, ina.change_times)
+
+
+def run_batch(algo_names: list, file_tags: list, seeds: list, workers: int = None,
+              servers: list = (1,)) -> list[dict]:
+    """
+    Runs every algorithm on every input with every seed and every number
+    of servers in parallel
+    Returns rows of the results table sorted by (algo_name, file_tag, servers, seed),
+    competitive_ratio is None for several servers
+    workers - number of processes, all cores if None
+    """
+    for algo_name in algo_names:
+        assert algo_name in METHODS, "Unknown algorithm: " + algo_name
+
+    # Each input is parsed once for the whole batch
+    inputs = {tag: InputParser.by_tag(tag, False) for tag in file_tags}
+    tasks = [
+        (algo_name, tag, seed, num_servers)
+        for algo_name in algo_names for tag in file_tags for seed in seeds for num_servers in servers
+    ]
+    if len(tasks) == 0:
+        return []
+
+    with make_pool(inputs, workers) as pool:
+        # The offline bound exists only for one server
+        bounds = {tag: pool.submit(bound_one_, tag) for tag in file_tags} if 1 in servers else {}
+        rows = list(pool.map(run_one_, *zip(*tasks)))
+        for row in rows:
+            if row["servers"] == 1:
+                area = row["total_mean_queue"] * row["time"]
+                row["competitive_ratio"] = competitive_ratio(area, bounds[row["file_tag"]].result())
+
+    rows.sort(key=lambda row: (row["algo_name"], str(row["file_tag"]), row["servers"], row["seed"]))
+    return rows
+
+
+def write_results(rows: list[dict], filename: str):
+    """
+    Writes rows of the results table to the csv file
+    """
+    with open(filename, 'w', newline='\n') as file:
+        writer = csv.DictWriter(file, RESULT_COLUMNS, delimiter=',', quotechar='"')
+        writer.writeheader()
+        writer.writerows(rows)
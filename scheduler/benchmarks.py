@@ -0,0 +1,302 @@
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import subprocess
+import tempfile
+
+import numpy as np
+
+from scheduler.cache import InputCache
+from scheduler.events import Event, Events
+from scheduler.input_parser import InputParser, InputGenerator, IN_DIR
+from scheduler.logging_utils import get_default_logger
+from scheduler.methods import METHODS, MBrainLike, Memory
+from scheduler.solver import Solver
+
+logger = get_default_logger(__name__)
+logger.setLevel(logging.INFO)
+
+# Seconds allowed for the interpreter start with imports of the scripts
+# and the cached input parsing
+STARTUP_BUDGET = 1.0
+
+
+def best_time_(func, repeats: int) -> float:
+    """
+    Returns the minimum time of func() in seconds
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def startup(file_tag, repeats: int = 5, budget: float = STARTUP_BUDGET) -> dict:
+    """
+    Measures the startup of run_algo on the input of file_tag (best of repeats, seconds):
+    import - python process start and import of scheduler.scripts
+    project_dir - InputParser.get_project_dir
+    parse - parsing of the csv input files
+    cached - loading of the input from the cache
+    Returns the times and "over_budget" flag: import + cached > budget
+    """
+    base_dir = InputParser.get_project_dir() + IN_DIR
+    filenames = [
+        base_dir + "arrivals_" + str(file_tag) + ".csv",
+        base_dir + "change_times_" + str(file_tag) + ".csv",
+        base_dir + "work_times_" + str(file_tag) + ".csv"
+    ]
+
+    res = {}
+    res["import"] = best_time_(
+        lambda: subprocess.run([sys.executable, "-c", "import scheduler.scripts"], check=True), repeats
+    )
+    res["project_dir"] = best_time_(InputParser.get_project_dir, repeats)
+    res["parse"] = best_time_(lambda: InputParser(*filenames, False), repeats)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = InputCache(cache_dir)
+        # Fills the cache
+        InputParser(*filenames, False, cache=cache)
+        res["cached"] = best_time_(lambda: InputParser(*filenames, False, cache=cache), repeats)
+
+    res["over_budget"] = res["import"] + res["cached"] > budget
+    for name in ("import", "project_dir", "parse", "cached"):
+        logger.info("{:12} {:.6f} s".format(name, res[name]))
+    if res["over_budget"]:
+        logger.warning("Startup takes more than {} s".format(budget))
+    return res
+
+
+# Parameters of the benchmark suite:
+# events - numbers of events pushed to and popped from Events
+# arrivals, queues - sweeps of the Solver runs of each method, the other
+#     parameter is fixed to the first value of its list
+# memory - capacities of the MBrainLike memory
+# limits - maximum number of arrivals of the Solver runs of each method
+PRESETS = {
+    "quick": {
+        "events"  : [10 ** 4, 10 ** 5],
+        "arrivals": [10 ** 3, 10 ** 4],
+        "queues"  : [3, 10, 100],
+        "memory"  : [100, 1000],
+        "limits"  : {"MBrainLike": 10 ** 4}
+    },
+    "full": {
+        "events"  : [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7],
+        "arrivals": [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7],
+        "queues"  : [2, 10, 100, 1000],
+        "memory"  : [100, 1000, 10000, 100000],
+        "limits"  : {"MBrainLike": 10 ** 5}
+    }
+}
+
+# Relative change of a result treated as a regression
+TOLERANCE = 0.1
+# Load of the server in the synthetic inputs
+LOAD = 0.9
+
+
+class SyntheticInput:
+    """
+    Random input with the same interface as InputParser, nothing is read from files
+    """
+    arrivals_    : object
+    change_times_: list[list]
+    work_times_  : list
+
+    def __init__(self, num_arrivals: int, num_queues: int, seed: int = 0):
+        rng = random.Random(seed)
+        self.work_times_ = [rng.randint(1, 5) for _ in range(num_queues)]
+        self.change_times_ = [
+            [0 if i == j else rng.randint(1, 5) for j in range(num_queues)] for i in range(num_queues)
+        ]
+        # Tasks arrive slower than they are done without changes
+        prob_step = min(1.0, LOAD / (sum(self.work_times_) / num_queues))
+        gen = InputGenerator(self.change_times_, self.work_times_)
+        gen.generate_data(prob_step, [1 / num_queues] * num_queues, num_arrivals, seed)
+        self.arrivals_ = gen.arrivals()
+
+    @property
+    def arrivals(self):
+        return self.arrivals_
+
+    @property
+    def change_times(self):
+        return self.change_times_
+
+    @property
+    def work_times(self):
+        return self.work_times_
+
+
+def result_(value: float, unit: str, better: str, **params) -> dict:
+    """
+    better - "higher" or "lower"
+    """
+    return dict(params, value=value, unit=unit, better=better)
+
+
+def bench_events(num_events: int, repeats: int = 3, seed: int = 0) -> dict:
+    """
+    Throughput of Events.add followed by Events.get of all events (best of repeats)
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = rng.integers(0, num_events, num_events).tolist()
+    events = [Event(timestamp, Event.UNLOAD, 0) for timestamp in timestamps]
+
+    def push_pop():
+        calendar = Events()
+        for ev in events:
+            calendar.add(ev)
+        while calendar.size() != 0:
+            calendar.get()
+
+    seconds = best_time_(push_pop, repeats)
+    return result_(2 * num_events / seconds, "ops/s", "higher", events=num_events)
+
+
+def time_decisions_(met):
+    """
+    Wraps met.load to record the duration of each decision in nanoseconds
+    """
+    durations = []
+    load = met.load
+
+    def timed_load(*args):
+        start = time.perf_counter_ns()
+        action = load(*args)
+        durations.append(time.perf_counter_ns() - start)
+        return action
+
+    met.load = timed_load
+    return durations
+
+
+def bench_solver(algo_name: str, num_arrivals: int, num_queues: int, memory: int = None,
+                 repeats: int = 3, seed: int = 0) -> list[dict]:
+    """
+    Runs the method on the synthetic input without statistics
+    Returns the events per second of the whole run and the decision latency,
+    the best of repeats runs with the same seed
+    memory - capacity of the MBrainLike memory, 10 ** num_queues if None
+    """
+    ina = SyntheticInput(num_arrivals, num_queues, seed)
+    throughput, mean, p99 = 0.0, float("inf"), float("inf")
+    for _ in range(repeats):
+        random.seed(seed)
+        met = METHODS[algo_name](ina)
+        if memory is not None:
+            met.memory_size_ = memory
+            met.memory_ = Memory(num_queues, memory, met.config_.eviction, met.config_)
+        durations = time_decisions_(met)
+
+        start = time.perf_counter()
+        sol = Solver(ina, met, accumulators=[], keep_distrib=False)
+        sol.simulate()
+        seconds = time.perf_counter() - start
+
+        # All events are added once and processed
+        throughput = max(throughput, sol.events_.counter_ / seconds)
+        durations = np.array(durations) / 1000
+        mean = min(mean, float(durations.mean()))
+        p99 = min(p99, float(np.percentile(durations, 99)))
+
+    params = {"algo_name": algo_name, "arrivals": num_arrivals, "queues": num_queues}
+    if memory is not None:
+        params["memory"] = memory
+    return [
+        result_(throughput, "events/s", "higher", metric="throughput", **params),
+        result_(mean, "us", "lower", metric="decision_mean", **params),
+        result_(p99, "us", "lower", metric="decision_p99", **params)
+    ]
+
+
+def result_name(res: dict) -> str:
+    """
+    Unique name of the result, e.g. solver/MSmart/arrivals=1000/queues=3/throughput
+    """
+    params = [key + "=" + str(value) for key, value in res.items()
+              if key not in ("value", "unit", "better", "bench", "algo_name", "metric")]
+    return "/".join([res["bench"]] + ([res["algo_name"]] if "algo_name" in res else []) +
+                    params + ([res["metric"]] if "metric" in res else []))
+
+
+def run_suite(preset: str = "quick", algo_names: list = None, repeats: int = 3, seed: int = 0) -> dict:
+    """
+    Runs the benchmarks with the parameters of PRESETS[preset]
+    algo_names - methods to benchmark, all METHODS if None
+    repeats - each result is the best of repeats runs
+    Returns {"meta": environment, "results": {result name: result}}
+    """
+    params = PRESETS[preset]
+    if algo_names is None:
+        algo_names = list(METHODS)
+    results = []
+
+    for num_events in params["events"]:
+        results.append(dict(bench_events(num_events, repeats, seed), bench="events"))
+
+    for algo_name in algo_names:
+        limit = params["limits"].get(algo_name)
+        runs = [(num, params["queues"][0]) for num in params["arrivals"]]
+        runs += [(params["arrivals"][0], num) for num in params["queues"][1:]]
+        for num_arrivals, num_queues in runs:
+            if limit is not None and num_arrivals > limit:
+                continue
+            logger.info("{} arrivals={} queues={}".format(algo_name, num_arrivals, num_queues))
+            for res in bench_solver(algo_name, num_arrivals, num_queues, None, repeats, seed):
+                results.append(dict(res, bench="solver"))
+
+        if issubclass(METHODS[algo_name], MBrainLike):
+            for memory in params["memory"]:
+                num_arrivals = min(params["arrivals"][-1], limit or params["arrivals"][-1])
+                logger.info("{} memory={}".format(algo_name, memory))
+                for res in bench_solver(algo_name, num_arrivals, params["queues"][0], memory, repeats, seed):
+                    results.append(dict(res, bench="memory"))
+
+    return {
+        "meta": {
+            "preset": preset,
+            "repeats": repeats,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S")
+        },
+        "results": {result_name(res): res for res in results}
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float = TOLERANCE) -> list[dict]:
+    """
+    Compares results of run_suite with results present in both
+    Returns [{"name", "baseline", "current", "change"}] of the regressions:
+    results worse than the baseline by more than tolerance
+    """
+    regressions = []
+    for name, res in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["value"]
+        if old == 0:
+            continue
+        change = res["value"] / old - 1
+        worse = -change if res["better"] == "higher" else change
+        if worse > tolerance:
+            regressions.append({"name": name, "baseline": old, "current": res["value"], "change": change})
+    return regressions
+
+
+def save(results: dict, filename: str):
+    with open(filename, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def load(filename: str) -> dict:
+    with open(filename) as file:
+        return json.load(file)
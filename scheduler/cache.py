@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+from scheduler.arrivals import Arrivals, ArrivalsWriter
+from scheduler.logging_utils import get_default_logger
+
+logger = get_default_logger(__name__)
+logger.setLevel(logging.INFO)
+
+CACHE_DIR = "/data/cache/"
+# Changes of the entry format invalidate old entries
+CACHE_VERSION = 1
+
+
+class InputCache:
+    """
+    Cache of parsed input files. The key is the path, modification time
+    and size of each file, so changed files are parsed again
+
+    Entry <key>.bin - arrivals in the binary format (mapped to memory on load),
+    <key>.json - change_times and work_times.
+    When the total size exceeds max_bytes, least recently used entries are removed
+    """
+    # Default limit of the cache size
+    MAX_BYTES = 1 << 30
+
+    dir_      : str
+    max_bytes_: int
+
+    def __init__(self, cache_dir: str, max_bytes: int = MAX_BYTES):
+        self.dir_ = cache_dir
+        self.max_bytes_ = max_bytes
+
+    @staticmethod
+    def key(*filenames) -> str:
+        """
+        Raises OSError if a file does not exist
+        """
+        hasher = hashlib.sha1(str(CACHE_VERSION).encode())
+        for filename in filenames:
+            stat = os.stat(filename)
+            hasher.update("{}|{}|{}\n".format(os.path.abspath(filename), stat.st_mtime_ns, stat.st_size).encode())
+        return hasher.hexdigest()
+
+    def entry_(self, key: str) -> tuple[str, str]:
+        return os.path.join(self.dir_, key + ".bin"), os.path.join(self.dir_, key + ".json")
+
+    def get(self, key: str):
+        """
+        Returns (arrivals, change_times, work_times) or None
+        """
+        arrivals_fn, tables_fn = self.entry_(key)
+        if not (os.path.exists(arrivals_fn) and os.path.exists(tables_fn)):
+            return None
+        try:
+            with open(tables_fn) as file:
+                tables = json.load(file)
+            arrivals = Arrivals.open(arrivals_fn)
+        except (OSError, ValueError, AssertionError):
+            logger.warning("Broken cache entry " + key)
+            self.remove_(key)
+            return None
+
+        # Recently used entries are evicted last
+        os.utime(tables_fn)
+        return arrivals, tables["change_times"], tables["work_times"]
+
+    def put(self, key: str, arrivals: Arrivals, change_times: list[list], work_times: list):
+        os.makedirs(self.dir_, exist_ok=True)
+        arrivals_fn, tables_fn = self.entry_(key)
+        # Files are renamed when complete, the entry is valid only after
+        # the tables file is renamed. Each writer has its own temporary
+        # files, so processes filling the same entry do not clobber them
+        arrivals_tmp, tables_tmp = self.temp_file_(arrivals_fn), self.temp_file_(tables_fn)
+        try:
+            with ArrivalsWriter(arrivals_tmp) as writer:
+                writer.write(arrivals.timestamps, arrivals.queues)
+            with open(tables_tmp, 'w') as file:
+                json.dump({"change_times": change_times, "work_times": work_times}, file)
+            os.replace(arrivals_tmp, arrivals_fn)
+            os.replace(tables_tmp, tables_fn)
+        finally:
+            for filename in (arrivals_tmp, tables_tmp):
+                if os.path.exists(filename):
+                    os.remove(filename)
+        self.evict_()
+
+    def temp_file_(self, filename: str) -> str:
+        """
+        Creates a new empty file in the cache directory for the content of filename
+        """
+        with tempfile.NamedTemporaryFile(dir=self.dir_, prefix=os.path.basename(filename) + ".", suffix=".tmp",
+                                         delete=False) as file:
+            return file.name
+
+    def remove_(self, key: str):
+        for filename in self.entry_(key):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def evict_(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.dir_):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            arrivals_fn, tables_fn = self.entry_(key)
+            size = os.path.getsize(tables_fn)
+            if os.path.exists(arrivals_fn):
+                size += os.path.getsize(arrivals_fn)
+            entries.append((os.path.getmtime(tables_fn), size, key))
+            total += size
+
+        entries.sort()
+        # The newest entry is kept even if it is larger than the limit
+        for _, size, key in entries[:-1]:
+            if total <= self.max_bytes_:
+                break
+            self.remove_(key)
+            total -= size
+            logger.info("Evicted cache entry " + key)
+
+    def clear(self):
+        if not os.path.isdir(self.dir_):
+            return
+        for name in os.listdir(self.dir_):
+            os.remove(os.path.join(self.dir_, name))
@@ -0,0 +1,122 @@
+import io
+import os
+import zlib
+import pickle
+import struct
+
+from concurrent.futures import ThreadPoolExecutor, Future
+
+# File: MAGIC, version (uint32), zlib compressed pickle of the state
+MAGIC = b"SCHEDCKP"
+VERSION = 1
+HEADER = struct.Struct("<8sI")
+# zlib level: checkpoints are written often, speed is more important
+LEVEL = 1
+
+
+class Pickler_(pickle.Pickler):
+    """
+    Saves the external objects by their names
+    """
+
+    def __init__(self, file, external: dict):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.names_ = {id(obj): name for name, obj in external.items()}
+
+    def persistent_id(self, obj):
+        return self.names_.get(id(obj))
+
+
+class Unpickler_(pickle.Unpickler):
+
+    def __init__(self, file, external: dict):
+        super().__init__(file)
+        self.external_ = external
+
+    def persistent_load(self, name):
+        return self.external_[name]
+
+
+def dumps(state, external: dict = None) -> bytes:
+    """
+    Returns the pickle of the state, it is independent of later changes of the state
+    external - {name: object} not saved, e.g. objects which can not be pickled.
+        References to them are restored by read to the objects with the same names
+    """
+    external = {name: obj for name, obj in (external or {}).items() if obj is not None}
+    if len(external) == 0:
+        return pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    buffer = io.BytesIO()
+    Pickler_(buffer, external).dump(state)
+    return buffer.getvalue()
+
+
+def write_(filename: str, data: bytes):
+    # Readers never see a partially written file
+    with open(filename + ".tmp", 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION))
+        file.write(zlib.compress(data, LEVEL))
+    os.replace(filename + ".tmp", filename)
+
+
+def write(filename: str, state, external: dict = None):
+    write_(filename, dumps(state, external))
+
+
+def read(filename: str, external: dict = None):
+    """
+    Returns the state written by write or CheckpointWriter.
+    Checkpoints are pickles, read only trusted files
+    external - see dumps
+    """
+    with open(filename, 'rb') as file:
+        data = file.read()
+    assert len(data) >= HEADER.size, filename + " is not a checkpoint"
+    magic, version = HEADER.unpack_from(data)
+    assert magic == MAGIC, filename + " is not a checkpoint"
+    assert version == VERSION, "Unsupported checkpoint version " + str(version)
+    return Unpickler_(io.BytesIO(zlib.decompress(data[HEADER.size:])), external or {}).load()
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints in the background thread: the state is pickled by
+    the caller, compression and writing do not block it. At most one
+    write is pending, the next one waits for it.
+    The thread is started by write and stopped by close
+    """
+    filename_: str
+    # None until the first write after close
+    executor_: ThreadPoolExecutor
+    pending_ : Future
+
+    def __init__(self, filename: str):
+        self.filename_ = filename
+        self.executor_ = None
+        self.pending_ = None
+
+    def write(self, state, external: dict = None):
+        data = dumps(state, external)
+        self.wait()
+        if self.executor_ is None:
+            self.executor_ = ThreadPoolExecutor(1)
+        self.pending_ = self.executor_.submit(write_, self.filename_, data)
+
+    def wait(self):
+        """
+        Waits for the pending write, raises its error
+        """
+        if self.pending_ is not None:
+            pending, self.pending_ = self.pending_, None
+            pending.result()
+
+    def close(self):
+        """
+        Waits for the pending write and stops the thread, write may be called again
+        """
+        try:
+            self.wait()
+        finally:
+            if self.executor_ is not None:
+                self.executor_.shutdown()
+                self.executor_ = None
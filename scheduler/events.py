@@ -1,8 +1,17 @@
+import heapq
+import itertools
+
+from typing import Iterator
+
+from scheduler.arrivals import Arrivals
+
 class Event:
-    ARRIVE  = "arrive"
-    LOAD    = "load"
-    LOAD_CH = "load ch"
-    UNLOAD  = "unload"
+    ARRIVE       = "arrive"
+    # All arrivals with the same timestamp
+    ARRIVE_BATCH = "arrive batch"
+    LOAD         = "load"
+    LOAD_CH      = "load ch"
+    UNLOAD       = "unload"
 
     timestamp_: int
 
@@ -12,10 +21,18 @@ class Event:
     # The number of the queue associated with the event
     qnumber_: int
 
-    def __init__(self, timestamp, ttype, qnumber):
+    # The number of the server associated with the event
+    server_: int
+
+    # Queue numbers of the ARRIVE_BATCH event in the arrival order, else None
+    qnumbers_: list
+
+    def __init__(self, timestamp, ttype, qnumber, server=0, qnumbers=None):
         self.timestamp_ = timestamp
         self.type_ = ttype
         self.qnumber_ = qnumber
+        self.server_ = server
+        self.qnumbers_ = qnumbers
 
     def __repr__(self) -> str:
         return "{0:4} : {1:10} {2:1}".format(
@@ -27,9 +44,9 @@ class Event:
             return False
         if other.type == Event.UNLOAD:
             return True
-        if self.type_ == Event.ARRIVE:
+        if self.type_ in (Event.ARRIVE, Event.ARRIVE_BATCH):
             return False
-        if other.type == Event.ARRIVE:
+        if other.type in (Event.ARRIVE, Event.ARRIVE_BATCH):
             return True
         if self.type_ == Event.LOAD_CH:
             return False
@@ -58,6 +75,14 @@ class Event:
     def qnumber(self) -> int:
         return self.qnumber_
 
+    @property
+    def server(self) -> int:
+        return self.server_
+
+    @property
+    def qnumbers(self) -> list:
+        return self.qnumbers_
+
     @property
     def type(self) -> int:
         return self.type_
@@ -68,61 +93,182 @@ class Event:
 
 
 class Events:
-    # futher events
-    events_ = []
-
-    # already analyzed events
-    done_events_ = []
+    """
+    Calendar of the futher events
+
+    Events are kept in a binary heap ordered by (timestamp, type order,
+    insertion number), so add and get are O(log n). Arrivals are pulled
+    lazily from the iterable passed to arrives: only the next arrival
+    lives in the heap
+    """
+    # Processing order of the events with equal timestamps (see Event.type_gt_)
+    TYPE_ORDER = {
+        Event.UNLOAD       : 0,
+        Event.ARRIVE       : 1,
+        Event.ARRIVE_BATCH : 1,
+        Event.LOAD_CH      : 2,
+        Event.LOAD         : 3
+    }
+
+    # futher events, heap of [timestamp, type order, insertion number, Event]
+    events_: list
+
+    # already analyzed events, kept only if keep_done is True
+    done_events_: list[Event]
+    keep_done_: bool
+
+    # insertion counter, keeps FIFO order for equal events
+    counter_: int
+
+    # not yet added arrivals and the Event of the next of them
+    arrivals_: Iterator
+    next_arrival_: Event
+    # number of arrivals taken from arrivals_
+    consumed_: int
+
+    # arrivals with the same timestamp are added as one ARRIVE_BATCH event
+    coalesce_: bool
+    # the first arrival of the next batch, already taken from arrivals_
+    lookahead_: tuple
+
+    def __init__(self, keep_done=False):
+        """
+        keep_done - keep processed events for history, stats and queues_distrib
+        """
+        self.events_ = []
+        self.done_events_ = []
+        self.keep_done_ = keep_done
+        self.counter_ = 0
+        self.arrivals_ = iter(())
+        self.next_arrival_ = None
+        self.consumed_ = 0
+        self.coalesce_ = False
+        self.lookahead_ = None
+
+    def __getstate__(self) -> dict:
+        """
+        The arrivals iterator is not saved, see resume_arrivals
+        """
+        state = self.__dict__.copy()
+        state["arrivals_"] = None
+        return state
 
     def __repr__(self) -> str:
-        str_evs = [str(ev) for ev in self.events_]
+        str_evs = [str(elem[-1]) for elem in sorted(self.events_)]
         return "\n".join(str_evs)
 
     def add(self, event: Event):
-
-        if len(self.events_) == 0:
-            self.events_ = [event]
-            return
-
-        for i, ev in enumerate(self.events_):
-            if event < ev:
-                self.events_.insert(i, event)
-                return
-        self.events_.append(event)
+        heapq.heappush(
+            self.events_,
+            (event.timestamp_, Events.TYPE_ORDER[event.type_], self.counter_, event)
+        )
+        self.counter_ += 1
 
     def size(self) -> int:
         return len(self.events_)
 
+    def next_timestamp(self) -> int:
+        """
+        Returns the timestamp of the next event, Events must not be empty
+        """
+        return self.events_[0][0]
+
     def get(self) -> Event:
-        ev = self.events_[0]
-        self.done_events_.append(ev)
-        self.events_.remove(ev)
+        ev = heapq.heappop(self.events_)[-1]
+        if self.keep_done_:
+            self.done_events_.append(ev)
+        if ev is self.next_arrival_:
+            self.pull_arrival_()
         return ev
 
-    def arrives(self, arrives):
-        for timestamp, number in arrives:
+    def arrives(self, arrives, coalesce=False):
+        """
+        arrives - iterable of [timestamp, queue number] sorted by timestamp
+        coalesce - add arrivals with the same timestamp as one ARRIVE_BATCH
+            event instead of ARRIVE events. The iterable is read one
+            arrival ahead
+        """
+        self.arrivals_ = iter(arrives)
+        self.consumed_ = 0
+        self.coalesce_ = coalesce
+        self.lookahead_ = None
+        self.pull_arrival_()
+
+    def resume_arrivals(self, arrives):
+        """
+        Continues the arrivals of the restored Events
+        arrives - the same iterable as in arrives, the consumed part is skipped:
+            Arrivals are read from the first not consumed one, other
+            iterables are iterated over from the beginning
+        """
+        if isinstance(arrives, Arrivals):
+            self.arrivals_ = arrives.iter_from(self.consumed_)
+        else:
+            self.arrivals_ = itertools.islice(iter(arrives), self.consumed_, None)
+
+    def pull_arrival_(self):
+        if self.coalesce_:
+            self.pull_batch_()
+            return
+
+        last_arrival = self.next_arrival_
+        self.next_arrival_ = None
+        for timestamp, number in self.arrivals_:
+            self.consumed_ += 1
             new_ev = Event(timestamp, Event.ARRIVE, number)
-            self.events_.append(new_ev)
+            assert last_arrival is None or last_arrival.timestamp_ <= timestamp, \
+                "Arrivals must be sorted by timestamp"
+            self.next_arrival_ = new_ev
+            self.add(new_ev)
+            return
+
+    def pull_batch_(self):
+        last_arrival = self.next_arrival_
+        self.next_arrival_ = None
+        if self.lookahead_ is None:
+            self.lookahead_ = next(self.arrivals_, None)
+            if self.lookahead_ is None:
+                return
+            self.consumed_ += 1
+
+        timestamp, number = self.lookahead_
+        assert last_arrival is None or last_arrival.timestamp_ <= timestamp, \
+            "Arrivals must be sorted by timestamp"
+        numbers = [number]
+        self.lookahead_ = None
+        for next_timestamp, next_number in self.arrivals_:
+            self.consumed_ += 1
+            if next_timestamp != timestamp:
+                assert next_timestamp > timestamp, "Arrivals must be sorted by timestamp"
+                self.lookahead_ = (next_timestamp, next_number)
+                break
+            numbers.append(next_number)
+
+        new_ev = Event(timestamp, Event.ARRIVE_BATCH, number, qnumbers=numbers)
+        self.next_arrival_ = new_ev
+        self.add(new_ev)
 
     def arrive(self, timestamp, number):
         new_ev = Event(timestamp, Event.ARRIVE, number)
         self.add(new_ev)
 
-    def load_ch(self, timestamp, qnumber):
-        new_ev = Event(timestamp, Event.LOAD_CH, qnumber)
+    def load_ch(self, timestamp, qnumber, server=0):
+        new_ev = Event(timestamp, Event.LOAD_CH, qnumber, server)
         self.add(new_ev)
 
-    def load(self, timestamp, qnumber):
-        new_ev = Event(timestamp, Event.LOAD, qnumber)
+    def load(self, timestamp, qnumber, server=0):
+        new_ev = Event(timestamp, Event.LOAD, qnumber, server)
         self.add(new_ev)
 
-    def unload(self, timestamp, qnumber):
-        new_ev = Event(timestamp, Event.UNLOAD, qnumber)
+    def unload(self, timestamp, qnumber, server=0):
+        new_ev = Event(timestamp, Event.UNLOAD, qnumber, server)
         self.add(new_ev)
 
     def history(self) -> str:
         """
-        Returns the entire history of analyzed events
+        Returns the entire history of analyzed events.
+        history, stats and queues_distrib require ARRIVE and LOAD events
+        (Solver without coalesce)
         """
 
         self.done_events_.sort()
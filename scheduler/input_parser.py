@@ -1,22 +1,28 @@
 import csv
+import os
 import logging
-import subprocess
+import functools
 
-from random import choices
+import numpy as np
 
+from scheduler.arrivals import Arrivals, ArrivalsWriter, CsvArrivals, read_csv
+from scheduler.cache import InputCache, CACHE_DIR
 from scheduler.logging_utils import get_default_logger
+from scheduler.processes import ArrivalProcess
 
 logger = get_default_logger(__name__)
 logger.setLevel(logging.INFO)
 
 IN_DIR = "/data/in/"
 OUT_DIR = "/data/out/"
+# Extension of the binary arrivals files
+BINARY_EXT = ".bin"
 
 class InputParser:
     """
     Read tables in python lists
 
-    arrivals = list[timestamp, queue tag]
+    arrivals = Arrivals, sequence of [timestamp, queue tag]
     change_times = matrix NxN with changes costs
     work_times = list with N elements, work time for each queue
     """
@@ -24,15 +30,22 @@ class InputParser:
     arrivals_fn_     : str
     change_times_fn_ : str
     work_times_fn_   : str
-    arrivals_        : list[int, int]
+    arrivals_        : Arrivals | CsvArrivals
     change_times_    : list[list]
     work_times_      : list
+    # Input is loaded from the cache, None if the cache is not used
+    from_cache_      : bool | None
 
-    def __init__(self, arrivals_fn: str, change_times_fn: str, work_times_fn: str, logs_on=True):
+    def __init__(self, arrivals_fn: str, change_times_fn: str, work_times_fn: str, logs_on=True,
+                 load_arrivals=True, cache: InputCache = None):
         """
-        arrivals_fn - filename for arrivals table
+        arrivals_fn - filename for arrivals table, csv or binary (.bin, see arrivals.py).
+            Binary file is mapped to memory
+        load_arrivals - if False, csv arrivals are not loaded, but streamed
+            from the file on each iteration (CsvArrivals)
         change_times_fn - filename for change_times table
         work_times_fn - filename for work_times table
+        cache - cache of parsed csv files, used only if load_arrivals
         """
         if not logs_on:
             logging.disable(logging.FATAL)
@@ -41,58 +54,94 @@ class InputParser:
         self.change_times_fn_ = change_times_fn
         self.work_times_fn_ = work_times_fn
 
-        logger.info('==== arrivals ====')
-        logger.info('time - queue num')
-        logger.info("")
+        self.from_cache_ = None
+        if cache is not None and load_arrivals and not arrivals_fn.endswith(BINARY_EXT):
+            key = InputCache.key(arrivals_fn, change_times_fn, work_times_fn)
+            cached = cache.get(key)
+            if cached is None:
+                self.from_cache_ = False
+                self.parse_(load_arrivals)
+                cache.put(key, self.arrivals_, self.change_times_, self.work_times_)
+            else:
+                self.arrivals_, self.change_times_, self.work_times_ = cached
+                self.from_cache_ = True
+        else:
+            self.parse_(load_arrivals)
 
-        self.arrivals_ = []
-        with open(arrivals_fn, newline='\n') as file:
-            table = csv.reader(file, delimiter=',', quotechar='"')
-            for row in table:
-                logger.info("{0:4} - {1:<2}".format(int(row[0]), int(row[1])))
-                self.arrivals_.append([int(row[0]), int(row[1])])
-        logger.info('==================\n')
+        if logs_on:
+            logger.info('==== arrivals ====')
+            logger.info('time - queue num')
+            logger.info("")
+            for timestamp, queue in self.arrivals_:
+                logger.info("{0:4} - {1:<2}".format(timestamp, queue))
+            logger.info('==================\n')
 
-        self.change_times_ = []
         logger.info('==== change_times ====')
-        with open(change_times_fn, newline='\n') as file:
-            table = csv.reader(file, delimiter=',', quotechar='"')
-            for row in table:
-                cur_row = [int(elem) for elem in row]
-                logger.info(cur_row)
-                self.change_times_.append(cur_row)
+        for row in self.change_times_:
+            logger.info(row)
         logger.info('======================\n')
 
         logger.info('==== work_times ====')
+        logger.info(self.work_times_)
+        logger.info('=====================\n')
+        logging.disable(logging.NOTSET)
+
+    def parse_(self, load_arrivals):
+        if self.arrivals_fn_.endswith(BINARY_EXT):
+            self.arrivals_ = Arrivals.open(self.arrivals_fn_)
+        elif not load_arrivals:
+            self.arrivals_ = CsvArrivals(self.arrivals_fn_)
+        else:
+            timestamps, queues = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int32)]
+            for chunk_timestamps, chunk_queues in read_csv(self.arrivals_fn_):
+                timestamps.append(np.array(chunk_timestamps, dtype=np.int64))
+                queues.append(np.array(chunk_queues, dtype=np.int32))
+            self.arrivals_ = Arrivals(np.concatenate(timestamps), np.concatenate(queues))
+
+        self.change_times_ = []
+        with open(self.change_times_fn_, newline='\n') as file:
+            table = csv.reader(file, delimiter=',', quotechar='"')
+            for row in table:
+                self.change_times_.append([int(elem) for elem in row])
+
         self.work_times_ = []
-        with open(work_times_fn, newline='\n') as file:
+        with open(self.work_times_fn_, newline='\n') as file:
             table = csv.reader(file, delimiter=',', quotechar='"')
             for row in table:
-                cur_row = [int(elem) for elem in row]
-                logger.info(cur_row)
-                self.work_times_ = cur_row
-        logger.info('=====================\n')
-        logging.disable(logging.NOTSET)
+                self.work_times_ = [int(elem) for elem in row]
 
     @staticmethod
-    def by_tag(tag: int, logs_on=True):
+    def by_tag(tag: int, logs_on=True, load_arrivals=True, cache=True):
         """
         Simplifies version of __init__, where
-        arrivals_fn = arrivals_<tag>.csv
+        arrivals_fn = arrivals_<tag>.bin if it exists, else arrivals_<tag>.csv
         change_times_fn =change_times_<tag>.csv
         work_times_fn = work_times_<tag>.csv
+        cache - use the default cache (see default_cache)
         """
         base_dir = InputParser.get_project_dir() + IN_DIR
+        arrivals_fn = base_dir + "arrivals_" + str(tag) + BINARY_EXT
+        if not os.path.exists(arrivals_fn):
+            arrivals_fn = base_dir + "arrivals_" + str(tag) + ".csv"
         return InputParser(
-            base_dir + "arrivals_" + str(tag) + ".csv",
+            arrivals_fn,
             base_dir + "change_times_" + str(tag) + ".csv",
             base_dir + "work_times_" + str(tag) + ".csv",
-            logs_on
+            logs_on,
+            load_arrivals,
+            InputParser.default_cache() if cache else None
         )
 
+    @staticmethod
+    def default_cache() -> InputCache:
+        """
+        Cache in the data/cache directory of the project
+        """
+        return InputCache(InputParser.get_project_dir() + CACHE_DIR)
+
     @staticmethod
     def get_project_dir():
-        return subprocess.getoutput("pwd")
+        return os.getcwd()
 
     @property
     def arrivals(self):
@@ -106,15 +155,26 @@ class InputParser:
     def work_times(self):
         return self.work_times_
 
+    @property
+    def from_cache(self) -> bool | None:
+        return self.from_cache_
+
     def get_out_filename(self):
         filename = self.arrivals_fn_[self.arrivals_fn_.rfind('/'):]
         return InputParser.get_project_dir() + OUT_DIR + filename
 
 class InputGenerator:
     """
-    Generates a large amount of the input data based on distribution
+    Generates a large amount of the input data based on distribution.
+    Arrivals are generated and written by chunks, so the memory usage
+    does not depend on the number of arrivals
     """
-    arrivals_     : list[int, int]
+    # Number of arrivals generated at once
+    CHUNK = 1 << 20
+
+    # Returns iterator over chunks (timestamps, queues) of the generated arrivals
+    chunks_       : functools.partial
+    seed_         : int
     change_times_ : list[list]
     work_times_   : list
 
@@ -122,7 +182,13 @@ class InputGenerator:
         self.change_times_ = change_times
         self.work_times_ = work_times
 
-    def generate_data(self, prob_step, prob_queues, num_samples):
+    def set_seed_(self, seed):
+        # The same arrivals are generated on each write
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.seed_ = seed
+
+    def generate_data(self, prob_step, prob_queues, num_samples, seed=None):
         """
         prob_step - the probability that a request will be generated 
             at a single timestamp. For example, prob_step = 0.5 means that
@@ -130,30 +196,85 @@ class InputGenerator:
         prob_queues - list with probabilities. prob_queues[i] contains the
             probability that a request will be arrived in the i queue.
             sum(prob_queues) must be == 1
+        num_samples - number of arrivals
+        seed - seed of the generator, random if None
+        """
+        assert 0 < prob_step <= 1
+        self.set_seed_(seed)
+        self.chunks_ = functools.partial(self.bernoulli_chunks_, prob_step, list(prob_queues), num_samples)
+
+    def bernoulli_chunks_(self, prob_step, prob_queues, num_samples):
+        rng = np.random.default_rng(self.seed_)
+        # Gaps between successes of the Bernoulli trials are geometric,
+        # the first timestamp is 0
+        last = -1
+        for start in range(0, num_samples, InputGenerator.CHUNK):
+            size = min(InputGenerator.CHUNK, num_samples - start)
+            timestamps = last + np.cumsum(rng.geometric(prob_step, size))
+            queues = rng.choice(len(prob_queues), size, p=prob_queues)
+            last = timestamps[-1]
+            yield timestamps, queues
+
+    def generate_processes(self, processes: list[ArrivalProcess], num_samples, seed=None):
+        """
+        processes - arrival process of each queue (see processes.py)
+        num_samples - number of arrivals
+        seed - seed of the generator, random if None
+        Arrival times are rounded down to integer timestamps
+        Raises ValueError if arrivals are requested, but all mean rates are 0
         """
-        num_queues = len(prob_queues)
-        queues = choices(list(range(num_queues)), prob_queues, k=num_samples)
-        times = choices([0, 1], [1-prob_step, prob_step], k=int(num_samples / prob_step))
+        if num_samples > 0 and sum(proc.mean_rate() for proc in processes) <= 0:
+            raise ValueError("Arrival processes have zero mean rate, {} arrivals cannot be generated".format(
+                num_samples))
+        self.set_seed_(seed)
+        self.chunks_ = functools.partial(self.processes_chunks_, processes, num_samples)
 
-        timestamps = [i for i, time in enumerate(times) if time != 0]
-        queues = queues[:len(timestamps)]
+    def processes_chunks_(self, processes, num_samples):
+        if num_samples <= 0:
+            return
+        rng = np.random.default_rng(self.seed_)
+        for proc in processes:
+            proc.reset(rng)
+        # Time window with CHUNK arrivals on average
+        window = InputGenerator.CHUNK / sum(proc.mean_rate() for proc in processes)
 
-        self.arrivals_ = list(map(list, zip(timestamps, queues)))
-        #print(len(self.arrivals_))
-        #print(sum(queues))
+        start = 0.0
+        left = num_samples
+        while left > 0:
+            times = [proc.times(rng, start, start + window) for proc in processes]
+            start += window
+            queues = np.concatenate([np.full(len(elem), qnum) for qnum, elem in enumerate(times)])
+            times = np.concatenate(times)
+            order = np.argsort(times, kind='stable')[:left]
+            left -= len(order)
+            yield np.floor(times[order]).astype(np.int64), queues[order]
+
+    def arrivals(self) -> Arrivals:
+        """
+        Returns the generated arrivals in memory
+        """
+        chunks = list(self.chunks_())
+        return Arrivals(
+            np.concatenate([np.zeros(0, dtype=np.int64)] + [elem[0] for elem in chunks]),
+            np.concatenate([np.zeros(0, dtype=np.int32)] + [elem[1] for elem in chunks])
+        )
 
     def write(self, arrivals_fn: str, change_times_fn: str, work_times_fn: str):
         """
         Writes generated input data to files
 
-        arrivals_fn - filename for arrivals table
+        arrivals_fn - filename for arrivals table, binary if it ends with .bin
         change_times_fn - filename for change_times table
         work_times_fn - filename for work_times table
         """
-        with open(arrivals_fn, 'w+', newline='\n') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"')
-            for row in self.arrivals_:
-                writer.writerow(row)
+        if arrivals_fn.endswith(BINARY_EXT):
+            with ArrivalsWriter(arrivals_fn) as writer:
+                for timestamps, queues in self.chunks_():
+                    writer.write(timestamps, queues)
+        else:
+            with open(arrivals_fn, 'w+', newline='\n') as file:
+                for timestamps, queues in self.chunks_():
+                    np.savetxt(file, np.column_stack((timestamps, queues)), fmt='%d', delimiter=',')
 
         with open(change_times_fn, 'w+', newline='\n') as file:
             writer = csv.writer(file, delimiter=',', quotechar='"')
@@ -164,17 +285,16 @@ class InputGenerator:
             writer = csv.writer(file, delimiter=',', quotechar='"')
             writer.writerow(self.work_times_)
 
-    def write_by_tag(self, tag: int):
+    def write_by_tag(self, tag: int, binary=False):
         """
         Simplifies version of write, where
-        arrivals_fn = arrivals_<tag>.csv
+        arrivals_fn = arrivals_<tag>.bin if binary, else arrivals_<tag>.csv
         change_times_fn =change_times_<tag>.csv
         work_times_fn = work_times_<tag>.csv
         """
-        cur_dir = subprocess.getoutput("pwd")
-        base_dir = cur_dir + OUT_DIR
+        base_dir = InputParser.get_project_dir() + OUT_DIR
         self.write(
-            base_dir + "arrivals_" + str(tag) + ".csv",
+            base_dir + "arrivals_" + str(tag) + (BINARY_EXT if binary else ".csv"),
             base_dir + "change_times_" + str(tag) + ".csv",
             base_dir + "work_times_" + str(tag) + ".csv",
         )
@@ -0,0 +1,143 @@
+import bisect
+import json
+import math
+import os
+
+from typing import Callable
+
+# Upper bounds of the duration histograms in seconds: 1us ... ~1s
+TIME_BUCKETS = [1e-6 * 2 ** i for i in range(21)]
+# Prefix of the exported metric names
+PREFIX = "scheduler_"
+
+
+class Histogram:
+    """
+    Counts of observations in the buckets (-inf, bound], like in Prometheus
+    """
+    bounds_: list[float]
+    counts_: list[int]
+    sum_   : float
+    count_ : int
+
+    def __init__(self, bounds: list[float] = TIME_BUCKETS):
+        self.bounds_ = list(bounds)
+        # The last bucket is (bounds[-1], inf)
+        self.counts_ = [0] * (len(self.bounds_) + 1)
+        self.sum_ = 0.0
+        self.count_ = 0
+
+    def observe(self, value: float):
+        self.counts_[bisect.bisect_left(self.bounds_, value)] += 1
+        self.sum_ += value
+        self.count_ += 1
+
+    def to_dict(self) -> dict:
+        return {"bounds": self.bounds_, "counts": self.counts_, "sum": self.sum_, "count": self.count_}
+
+
+class Metrics:
+    """
+    Counters, histograms and gauges of a run, exported as json or
+    Prometheus text. Gauges are functions sampled by sample, their values
+    over time are kept as series
+
+    Nothing is collected unless Metrics is passed to the Solver
+    """
+    # name -> {labels: value}, labels is a tuple of (key, value)
+    counters_  : dict
+    histograms_: dict[str, Histogram]
+    gauges_    : dict[str, Callable]
+    # name -> ([timestamps], [values])
+    series_    : dict[str, tuple]
+
+    def __init__(self):
+        self.counters_ = {}
+        self.histograms_ = {}
+        self.gauges_ = {}
+        self.series_ = {}
+
+    def inc(self, name: str, value: int = 1, labels: tuple = ()):
+        counter = self.counters_.setdefault(name, {})
+        counter[labels] = counter.get(labels, 0) + value
+
+    def counter(self, name: str, labels: tuple = ()) -> int:
+        return self.counters_.get(name, {}).get(labels, 0)
+
+    def histogram(self, name: str, bounds: list[float] = TIME_BUCKETS) -> Histogram:
+        if name not in self.histograms_:
+            self.histograms_[name] = Histogram(bounds)
+        return self.histograms_[name]
+
+    def gauge(self, name: str, func: Callable):
+        """
+        func() returns the current value
+        """
+        self.gauges_[name] = func
+        self.series_[name] = ([], [])
+
+    def sample(self, timestamp: int):
+        """
+        Appends the current values of gauges to their series
+        """
+        for name, func in self.gauges_.items():
+            times, values = self.series_[name]
+            times.append(timestamp)
+            values.append(func())
+
+    def to_dict(self) -> dict:
+        return {
+            "counters": {name: counter_dict_(counter) for name, counter in self.counters_.items()},
+            "histograms": {name: hist.to_dict() for name, hist in self.histograms_.items()},
+            "gauges": {name: func() for name, func in self.gauges_.items()},
+            "series": {name: {"times": times, "values": values} for name, (times, values) in self.series_.items()}
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns metrics in the Prometheus text format, series are not exported
+        """
+        lines = []
+        for name, counter in self.counters_.items():
+            lines.append("# TYPE {} counter".format(PREFIX + name))
+            for labels, value in counter.items():
+                lines.append("{}{} {}".format(PREFIX + name, labels_str_(labels), value))
+
+        for name, hist in self.histograms_.items():
+            lines.append("# TYPE {} histogram".format(PREFIX + name))
+            cumulative = 0
+            for bound, count in zip(hist.bounds_ + [math.inf], hist.counts_):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append('{}_bucket{{le="{}"}} {}'.format(PREFIX + name, le, cumulative))
+            lines.append("{}_sum {}".format(PREFIX + name, repr(hist.sum_)))
+            lines.append("{}_count {}".format(PREFIX + name, hist.count_))
+
+        for name, func in self.gauges_.items():
+            lines.append("# TYPE {} gauge".format(PREFIX + name))
+            lines.append("{} {}".format(PREFIX + name, func()))
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename: str):
+        """
+        Writes Prometheus text if filename ends with .prom, else json
+        """
+        # Readers never see a partially written file
+        with open(filename + ".tmp", 'w') as file:
+            if filename.endswith(".prom"):
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), file, indent=2)
+        os.replace(filename + ".tmp", filename)
+
+
+def labels_str_(labels: tuple) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(key, value) for key, value in labels) + "}"
+
+
+def counter_dict_(counter: dict):
+    if list(counter) == [()]:
+        return counter[()]
+    return {labels_str_(labels): value for labels, value in counter.items()}
@@ -0,0 +1,81 @@
+import heapq
+import math
+
+
+def srpt_lower_bound(arrivals, work_times: list, change_times: list[list], servers: int = 1) -> float:
+    """
+    Returns the lower bound of the integral of the total number of waiting
+    tasks over time (see waiting_area) for any method with one server,
+    which knows all arrivals in advance
+
+    A task waits from the arrival until the load, so the integral is
+    sum(load - arrival) = sum(completion - duration - arrival), where the
+    duration is the change and the work time. The shortest remaining
+    duration first, which may interrupt tasks, gives the minimal sum of
+    completion times. Shorter durations do not increase this bound, so
+    the durations may be underestimated: tasks of the same queue are
+    served in the order of arrivals, the first task of each queue except
+    the initial one pays at least the minimum change time into the queue,
+    other tasks may pay nothing.
+    Bounds of the same kind for several servers are zero or far from
+    the optimum on real inputs, so only one server is supported
+    Takes O(n log n) for n arrivals
+    arrivals - iterable of (timestamp, queue number) sorted by timestamp
+    Raises ValueError if servers != 1
+    """
+    if servers != 1:
+        raise ValueError("The offline bound is supported only for one server, got {}".format(servers))
+    num_queues = len(work_times)
+    setups = [min((change_times[prev][qnumber] for prev in range(num_queues) if prev != qnumber), default=0)
+              for qnumber in range(num_queues)]
+    # The server starts at the queue 0
+    setups[0] = 0
+
+    # Remaining durations of the started and waiting tasks
+    tasks = []
+    now = 0.0
+    # Sum of completion times
+    total = 0.0
+
+    def run_until(end: float):
+        nonlocal now, total
+        while len(tasks) != 0 and now < end:
+            finish = now + tasks[0]
+            if finish <= end:
+                heapq.heappop(tasks)
+                total += finish
+                now = finish
+            else:
+                # The least remaining duration stays the least
+                heapq.heapreplace(tasks, tasks[0] - (end - now))
+                now = end
+
+    for timestamp, qnumber in arrivals:
+        run_until(timestamp)
+        now = max(now, timestamp)
+        duration = work_times[qnumber] + setups[qnumber]
+        setups[qnumber] = 0
+        heapq.heappush(tasks, duration)
+        total -= timestamp + duration
+    run_until(math.inf)
+    return max(0.0, total)
+
+
+def waiting_area(results: dict) -> float:
+    """
+    Returns the integral of the total number of waiting tasks over time
+    results - Solver results with "time" and "mean_queues"
+    """
+    return sum(results["mean_queues"]) * results["time"]
+
+
+def competitive_ratio(area: float, bound: float) -> float:
+    """
+    Returns the ratio of the waiting integral of the run with one server
+    to the offline bound
+    area - see waiting_area
+    bound - see srpt_lower_bound
+    """
+    if bound == 0:
+        return 1.0 if area == 0 else math.inf
+    return area / bound
@@ -0,0 +1,159 @@
+import json
+import math
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class ArrivalProcess(ABC):
+    """
+    Arrivals of one queue in continuous time
+    """
+
+    def reset(self, rng: np.random.Generator):
+        """
+        Executed before generation from the time 0
+        """
+        pass
+
+    @abstractmethod
+    def mean_rate(self) -> float:
+        """
+        Mean number of arrivals per time unit
+        """
+        pass
+
+    @abstractmethod
+    def times(self, rng: np.random.Generator, start: float, end: float) -> np.ndarray:
+        """
+        Returns sorted arrival times in [start, end).
+        Windows are requested one after another without gaps
+        """
+        pass
+
+
+def poisson_times_(rng: np.random.Generator, rate: float, start: float, end: float) -> np.ndarray:
+    num = rng.poisson(rate * (end - start))
+    return np.sort(rng.uniform(start, end, num))
+
+
+class PoissonProcess(ArrivalProcess):
+    """
+    Poisson process with the constant rate
+    """
+    rate_: float
+
+    def __init__(self, rate: float):
+        assert rate > 0
+        self.rate_ = rate
+
+    def mean_rate(self) -> float:
+        return self.rate_
+
+    def times(self, rng, start, end):
+        return poisson_times_(rng, self.rate_, start, end)
+
+
+class BurstyProcess(ArrivalProcess):
+    """
+    Markov-modulated Poisson process: the rate is rates[i] while the hidden
+    state is i. The state i lasts an exponential time with the rate
+    switch_rates[i], then the next state is selected uniformly from others
+    """
+    rates_       : list[float]
+    switch_rates_: list[float]
+    state_       : int
+    # Time of the next state switch
+    next_switch_ : float
+
+    def __init__(self, rates: list[float], switch_rates: list[float]):
+        assert len(rates) == len(switch_rates) and len(rates) >= 2
+        assert all(rate > 0 for rate in switch_rates)
+        self.rates_ = list(rates)
+        self.switch_rates_ = list(switch_rates)
+
+    def reset(self, rng):
+        self.state_ = 0
+        self.next_switch_ = rng.exponential(1 / self.switch_rates_[0])
+
+    def mean_rate(self) -> float:
+        # The share of time in the state is proportional to its mean duration
+        durations = [1 / rate for rate in self.switch_rates_]
+        return sum(rate * dur for rate, dur in zip(self.rates_, durations)) / sum(durations)
+
+    def times(self, rng, start, end):
+        parts = []
+        while True:
+            part_end = min(end, self.next_switch_)
+            if self.rates_[self.state_] > 0:
+                parts.append(poisson_times_(rng, self.rates_[self.state_], start, part_end))
+            if self.next_switch_ >= end:
+                break
+            start = self.next_switch_
+            others = [state for state in range(len(self.rates_)) if state != self.state_]
+            self.state_ = others[rng.integers(len(others))]
+            self.next_switch_ = start + rng.exponential(1 / self.switch_rates_[self.state_])
+        if len(parts) == 0:
+            return np.zeros(0)
+        return np.concatenate(parts)
+
+
+class DiurnalProcess(ArrivalProcess):
+    """
+    Poisson process with the periodic rate
+    rate(t) = rate * (1 + amplitude * sin(2 * pi * t / period + phase))
+    """
+    rate_     : float
+    amplitude_: float
+    period_   : float
+    phase_    : float
+
+    def __init__(self, rate: float, amplitude: float, period: float, phase: float = 0.0):
+        assert rate > 0 and 0 <= amplitude <= 1 and period > 0
+        self.rate_ = rate
+        self.amplitude_ = amplitude
+        self.period_ = period
+        self.phase_ = phase
+
+    def mean_rate(self) -> float:
+        return self.rate_
+
+    def rate(self, times: np.ndarray) -> np.ndarray:
+        return self.rate_ * (1 + self.amplitude_ * np.sin(2 * math.pi * times / self.period_ + self.phase_))
+
+    def times(self, rng, start, end):
+        # Thinning of the process with the maximum rate
+        max_rate = self.rate_ * (1 + self.amplitude_)
+        candidates = poisson_times_(rng, max_rate, start, end)
+        accepted = rng.uniform(0, max_rate, len(candidates)) < self.rate(candidates)
+        return candidates[accepted]
+
+
+PROCESSES = {
+    "poisson": PoissonProcess,
+    "bursty" : BurstyProcess,
+    "diurnal": DiurnalProcess
+}
+
+
+def make_processes(descriptions) -> list[ArrivalProcess]:
+    """
+    Creates one process per queue
+    descriptions - list of dicts {"type": <PROCESSES key>, <constructor arguments>}
+        or json file with this list. For example
+        [{"type": "poisson", "rate": 0.2},
+         {"type": "bursty", "rates": [0.05, 1.0], "switch_rates": [0.001, 0.01]},
+         {"type": "diurnal", "rate": 0.3, "amplitude": 0.8, "period": 86400}]
+    """
+    if isinstance(descriptions, str):
+        with open(descriptions) as file:
+            descriptions = json.load(file)
+
+    processes = []
+    for desc in descriptions:
+        params = dict(desc)
+        ptype = params.pop("type")
+        assert ptype in PROCESSES, "Unknown arrival process: " + ptype
+        processes.append(PROCESSES[ptype](**params))
+    return processes
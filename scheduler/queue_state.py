@@ -0,0 +1,111 @@
+import random
+
+from typing import Iterator
+
+
+class QueueState(list):
+    """
+    The number of waiting tasks in each queue with the index of non-empty
+    queues. It is a list, so methods can read it as before, but it must
+    be changed only by add and take
+    """
+    # Non-empty queues in arbitrary order
+    nonempty_: list[int]
+    # Position of each queue in nonempty_, -1 for empty queues
+    pos_: list[int]
+    # Sum of all counts
+    total_: int
+
+    def __init__(self, counts):
+        super().__init__(counts)
+        self.total_ = sum(self)
+        self.nonempty_ = []
+        self.pos_ = [-1] * len(self)
+        for qnumber, count in enumerate(self):
+            assert count >= 0
+            if count != 0:
+                self.pos_[qnumber] = len(self.nonempty_)
+                self.nonempty_.append(qnumber)
+
+    @staticmethod
+    def zeros(num_queues: int):
+        return QueueState([0] * num_queues)
+
+    def add(self, qnumber: int, count: int = 1):
+        if self[qnumber] == 0:
+            self.pos_[qnumber] = len(self.nonempty_)
+            self.nonempty_.append(qnumber)
+        self[qnumber] += count
+        self.total_ += count
+
+    def take(self, qnumber: int):
+        """
+        Removes one task from the queue
+        """
+        assert self[qnumber] > 0
+        self[qnumber] -= 1
+        self.total_ -= 1
+        if self[qnumber] == 0:
+            # The last non-empty queue takes the place of qnumber
+            pos = self.pos_[qnumber]
+            last = self.nonempty_.pop()
+            if last != qnumber:
+                self.nonempty_[pos] = last
+                self.pos_[last] = pos
+            self.pos_[qnumber] = -1
+
+    def total(self) -> int:
+        """
+        Returns the number of waiting tasks in all queues in O(1)
+        """
+        return self.total_
+
+    def is_empty(self) -> bool:
+        return len(self.nonempty_) == 0
+
+    def num_nonempty(self) -> int:
+        return len(self.nonempty_)
+
+    def nonempty(self) -> Iterator[int]:
+        """
+        Iterates over the non-empty queues in arbitrary order in O(number
+        of non-empty queues), the state must not be changed meanwhile
+        """
+        return iter(self.nonempty_)
+
+    def any_nonempty(self) -> int:
+        """
+        Returns some non-empty queue in O(1)
+        """
+        assert len(self.nonempty_) != 0
+        return self.nonempty_[-1]
+
+    def random_nonempty(self) -> int:
+        """
+        Returns uniformly random non-empty queue in O(1)
+        """
+        assert len(self.nonempty_) != 0
+        return self.nonempty_[random.randrange(len(self.nonempty_))]
+
+    def first_nonempty(self, order: list[int], costs: list) -> int:
+        """
+        Returns the first non-empty queue of order, where order is the list
+        of all queues sorted by (costs[queue], queue).
+        Takes O(min(position of the result in order, number of non-empty queues))
+        """
+        assert len(self.nonempty_) != 0
+        limit = len(self.nonempty_)
+        for steps, qnumber in enumerate(order):
+            if self[qnumber] != 0:
+                return qnumber
+            if steps >= limit:
+                break
+        # Few queues are non-empty
+        return min(self.nonempty_, key=lambda qnumber: (costs[qnumber], qnumber))
+
+
+def preference_orders(change_times: list[list]) -> list[list[int]]:
+    """
+    Returns for each queue q all queues sorted by (change_times[q][queue], queue)
+    """
+    return [sorted(range(len(row)), key=lambda qnumber: (row[qnumber], qnumber)) for row in change_times]
@@ -4,50 +4,403 @@ import cProfile, pstats, io
 import fire
 
 from scheduler.logging_utils import get_default_logger
-from scheduler.solver import Solver
-from scheduler.input_parser import InputParser, InputGenerator
-from scheduler.methods import METHODS
+from scheduler.input_parser import InputParser, IN_DIR, OUT_DIR, BINARY_EXT
+
+# Modules used by one command are imported by its function, so each
+# command starts without the imports of the others
 
 logger = get_default_logger(__name__)
 logger.setLevel(logging.INFO)
 
-def run_algo_impl(algo_name: str, file_tag: int):
+def run_algo_impl(algo_name: str, file_tag: int, memory_in: str = None, memory_out: str = None,
+                  config: str = None, stream=False, cache=True, metrics: str = None,
+                  metrics_every: int = None, servers: int = 1, coalesce=False, policy: str = None,
+                  bound=False, checkpoint_every: int = None, checkpoint: str = None, resume: str = None):
     """
     Run algorithm on input data
     algo_name - algorithm name
     file_tag - tag of input files
+    stream - read csv arrivals lazily during the run instead of loading them
+    cache - use the cache of parsed inputs in data/cache
+    metrics - file for the run metrics: json or Prometheus text if it ends with .prom
+        (see metrics.py). Metrics are not collected if None
+    metrics_every - write metrics each metrics_every events, only at the end if None
+    servers - number of parallel servers
+    coalesce - fewer calendar events with the same results (see Solver)
+    config - json file with the hyperparameters of MBrainLike (see tune), MTabular or MLookahead
+    memory_in - MBrainLike memory snapshot loaded before the run
+    memory_out - filename for the MBrainLike memory snapshot after the run,
+        data/out/memory_<file_tag>.npz by default
+    policy - FrozenPolicy snapshot (see freeze), MBrainLike runs without learning
+    bound - log the competitive ratio: the waiting integral of the run divided
+        by its offline lower bound (see offline.py), only for one server
+    checkpoint_every - write the state of the run each checkpoint_every events
+    checkpoint - checkpoint file, data/out/checkpoint_<file_tag>.bin by default
+    resume - checkpoint file to continue the interrupted run with the same
+        parameters from, memory_in is not used
+    Queue lengths over time are written to data/out/arrivals_<file_tag>.npz
+    (see QueuesSeries)
     """
+    from scheduler.methods import METHODS, MBrainLike, FrozenPolicy, MFrozen
+    from scheduler.metrics import Metrics
+    from scheduler.offline import srpt_lower_bound, waiting_area, competitive_ratio
+    from scheduler.solver import Solver
+
     if algo_name not in METHODS:
         logger.critical("Unknown algorithm: " + algo_name)
         return []
 
-    ina = InputParser.by_tag(file_tag, False)
-    met = METHODS[algo_name](ina)
-    sol = Solver(ina, met)
+    if memory_in is not None and not issubclass(METHODS[algo_name], MBrainLike):
+        logger.critical("Algorithm " + algo_name + " has no memory")
+        return []
+    if memory_in is not None and resume is not None:
+        logger.critical("The memory is restored from the checkpoint, memory_in is not used")
+        return []
+    if config is not None and METHODS[algo_name].CONFIG is None:
+        logger.critical("Algorithm " + algo_name + " has no hyperparameters")
+        return []
+    if policy is not None and (algo_name != "MBrainLike" or memory_in is not None or config is not None):
+        logger.critical("policy is used only with MBrainLike without memory_in and config")
+        return []
+
+    ina = InputParser.by_tag(file_tag, False, not stream, cache)
+    if policy is not None:
+        met = MFrozen(ina, FrozenPolicy.load(policy))
+    elif config is not None:
+        met = METHODS[algo_name](ina, METHODS[algo_name].CONFIG.load(config))
+    else:
+        met = METHODS[algo_name](ina)
+    if memory_in is not None:
+        met.load_memory(memory_in)
+    run_metrics = None
+    if metrics is not None:
+        run_metrics = Metrics()
+        if ina.from_cache is not None:
+            run_metrics.inc("input_cache_total", 1, (("result", "hit" if ina.from_cache else "miss"),))
+    if checkpoint_every is not None and checkpoint is None:
+        checkpoint = InputParser.get_project_dir() + OUT_DIR + "checkpoint_" + str(file_tag) + ".bin"
+    sol = Solver(ina, met, metrics=run_metrics, metrics_every=metrics_every, metrics_file=metrics,
+                 servers=servers, coalesce=coalesce, checkpoint_every=checkpoint_every,
+                 checkpoint_file=checkpoint, resume=resume)
+    # The method of the checkpoint
+    met = sol.method
     out = sol.run()
-    with open(ina.get_out_filename(), 'w') as f:
-        print(out, file=f)
-    return out
+    if bound and servers != 1:
+        logger.warning("The offline bound is supported only for one server")
+    elif bound:
+        lower = srpt_lower_bound(ina.arrivals, ina.work_times, ina.change_times)
+        logger.info("Offline lower bound {:.1f}, competitive ratio {:.3f}".format(
+            lower, competitive_ratio(waiting_area(sol.results()), lower)))
+    out.save(series_filename(file_tag))
+    if isinstance(met, MBrainLike):
+        if memory_out is None:
+            memory_out = memory_filename(file_tag)
+        met.save_memory(memory_out)
+
+def memory_filename(tag) -> str:
+    return InputParser.get_project_dir() + OUT_DIR + "memory_" + str(tag) + ".npz"
+
+def series_filename(tag) -> str:
+    return InputParser.get_project_dir() + OUT_DIR + "arrivals_" + str(tag) + ".npz"
 
 def run_algo():
     fire.Fire(run_algo_impl)
 
-def gen_data_impl(prob_step, prob_queues, num_samples, read_tag, write_tag):
+def gen_data_impl(read_tag, write_tag, num_samples, prob_step=None, prob_queues=None, processes=None,
+                  seed=None, binary=False):
     """
     Generates input data and writes it to the file 
-    prob_step, prob_queues, num_samples - see InputGenerator.generate_data
-    write_tag - see InputGenerator.write_by_tag
+    prob_step, prob_queues, num_samples, seed - see InputGenerator.generate_data
+    processes - arrival process of each queue instead of prob_step and prob_queues,
+        list of dicts or json file (see processes.make_processes)
+    write_tag, binary - see InputGenerator.write_by_tag
     read_tag - file tags from which the change_times and work_times tables will be obtained
     """
+    from scheduler.input_parser import InputGenerator
+    from scheduler.processes import make_processes
+
     ina = InputParser.by_tag(read_tag, False)
     gen = InputGenerator(ina.change_times, ina.work_times)
-    gen.generate_data(prob_step, list(prob_queues), num_samples)
-    gen.write_by_tag(write_tag)
+    if processes is not None:
+        try:
+            gen.generate_processes(make_processes(processes), num_samples, seed)
+        except ValueError as error:
+            logger.critical(str(error))
+            return
+    elif prob_step is not None and prob_queues is not None:
+        gen.generate_data(prob_step, list(prob_queues), num_samples, seed)
+    else:
+        logger.critical("prob_step and prob_queues or processes must be set")
+        return
+    gen.write_by_tag(write_tag, binary)
     logger.info("Data generated in the file tag " + str(write_tag))
 
 def gen_data():
     fire.Fire(gen_data_impl)
 
+def convert_arrivals_impl(file_tag):
+    """
+    Converts data/in/arrivals_<file_tag>.csv to the binary data/in/arrivals_<file_tag>.bin,
+    which is used by run_algo instead of the csv file
+    """
+    from scheduler.arrivals import convert_csv
+
+    base_dir = InputParser.get_project_dir() + IN_DIR + "arrivals_" + str(file_tag)
+    convert_csv(base_dir + ".csv", base_dir + BINARY_EXT)
+    logger.info("Arrivals converted to " + base_dir + BINARY_EXT)
+
+def convert_arrivals():
+    fire.Fire(convert_arrivals_impl)
+
+def train_impl(file_tags, memory_out: str, memory_in: str = None, epochs: int = 1):
+    """
+    Trains MBrainLike on the input data without collecting statistics
+    and writes the memory snapshot
+    file_tags - tag or list of tags of input files, all must have the same number of queues
+    memory_out - filename for the memory snapshot
+    memory_in - memory snapshot to continue training
+    epochs - number of passes over all input files
+    """
+    from scheduler.methods import MBrainLike
+    from scheduler.solver import Solver
+
+    if not isinstance(file_tags, (list, tuple)):
+        file_tags = [file_tags]
+
+    inputs = [InputParser.by_tag(tag, False) for tag in file_tags]
+    met = MBrainLike(inputs[0])
+    if memory_in is not None:
+        met.load_memory(memory_in)
+
+    for epoch in range(epochs):
+        for tag, ina in zip(file_tags, inputs):
+            Solver(ina, met, accumulators=[], keep_distrib=False, coalesce=True).simulate()
+            logger.info("Epoch {}, file tag {}: {} remembers".format(epoch, tag, len(met.memory_)))
+
+    met.save_memory(memory_out)
+    logger.info("Memory written to " + memory_out)
+
+def train():
+    fire.Fire(train_impl)
+
+def freeze_impl(memory_in: str, out_file: str, config: str = None, levels: int = None):
+    """
+    Compiles the MBrainLike memory snapshot into the FrozenPolicy for
+    run_algo --policy
+    memory_in - memory snapshot (see train)
+    out_file - filename for the policy snapshot
+    config - json file with the MBrainLike hyperparameters used for training
+    levels - quantisation levels of the queue proportions (see FrozenPolicy.compile)
+    """
+    from scheduler.methods import BrainConfig, Memory, FrozenPolicy
+
+    memory = Memory.load(memory_in, config=BrainConfig.load(config) if config is not None else None)
+    policy = FrozenPolicy.compile(memory, levels)
+    policy.save(out_file)
+    logger.info("Policy written to " + out_file)
+
+def freeze():
+    fire.Fire(freeze_impl)
+
+def run_batch_impl(algo_names, file_tags, seeds=1, out_file: str = None, workers: int = None, servers=1):
+    """
+    Runs every algorithm on every input with every seed and every number
+    of servers on all cores and writes one results table
+    algo_names - algorithm name or list of names
+    file_tags - tag or list of tags of input files
+    seeds - list of seeds or number of seeds (0, 1, ...)
+    servers - number of servers or list of numbers
+    out_file - csv file for the results, data/out/batch.csv by default
+    workers - number of processes, all cores by default
+    """
+    from scheduler.batch import run_batch, write_results
+    from scheduler.methods import METHODS
+
+    if not isinstance(algo_names, (list, tuple)):
+        algo_names = [algo_names]
+    if not isinstance(file_tags, (list, tuple)):
+        file_tags = [file_tags]
+    if isinstance(seeds, int):
+        seeds = list(range(seeds))
+    if not isinstance(servers, (list, tuple)):
+        servers = [servers]
+    for algo_name in algo_names:
+        if algo_name not in METHODS:
+            logger.critical("Unknown algorithm: " + algo_name)
+            return []
+
+    rows = run_batch(list(algo_names), list(file_tags), list(seeds), workers, list(servers))
+    if out_file is None:
+        out_file = InputParser.get_project_dir() + OUT_DIR + "batch.csv"
+    write_results(rows, out_file)
+    logger.info("{} runs written to {}".format(len(rows), out_file))
+    return rows
+
+def run_batch_cli():
+    fire.Fire(run_batch_impl)
+
+def tune_impl(file_tags, search: str = "halving", space: dict = None, num_configs: int = 27, seeds=1,
+              eta: int = 3, min_fraction: float = 1 / 9, out_file: str = None, workers: int = None,
+              seed: int = 0):
+    """
+    Searches MBrainLike hyperparameters in parallel and writes the best
+    config, which can be loaded by run_algo --config
+    file_tags - tag or list of tags of input files
+    search - grid, random or halving (see tuning.tune)
+    space - search space, tuning.DEFAULT_SPACE by default
+    num_configs - number of random configs
+    seeds - list of seeds or number of seeds (0, 1, ...) of each run
+    eta, min_fraction - see tuning.tune
+    out_file - json file for the best config, data/out/brain_config.json by default
+    workers - number of processes, all cores by default
+    seed - seed of the random configs
+    """
+    from scheduler.methods import BrainConfig
+    from scheduler.tuning import tune, GRID, RANDOM, HALVING
+
+    if not isinstance(file_tags, (list, tuple)):
+        file_tags = [file_tags]
+    if isinstance(seeds, int):
+        seeds = list(range(seeds))
+    if search not in (GRID, RANDOM, HALVING):
+        logger.critical("Unknown search: " + search)
+        return []
+
+    ranked = tune(list(file_tags), space, search, num_configs, list(seeds), eta, min_fraction, workers, seed)
+    for score, params in ranked[:5]:
+        logger.info("{:.4f} {}".format(score, params))
+
+    if out_file is None:
+        out_file = InputParser.get_project_dir() + OUT_DIR + "brain_config.json"
+    BrainConfig(**ranked[0][1]).save(out_file)
+    logger.info("Best config written to " + out_file)
+    return ranked
+
+def tune_cli():
+    fire.Fire(tune_impl)
+
+def bench_startup_impl(file_tag, repeats: int = 5, budget: float = None):
+    """
+    Measures the startup time of run_algo on the input of file_tag
+    (see benchmarks.startup)
+    budget - seconds, benchmarks.STARTUP_BUDGET if None
+    """
+    from scheduler import benchmarks
+
+    if budget is None:
+        budget = benchmarks.STARTUP_BUDGET
+    return benchmarks.startup(file_tag, repeats, budget)
+
+def bench_startup():
+    fire.Fire(bench_startup_impl)
+
+def benchmark_impl(preset: str = "quick", algo_names=None, out_file: str = None, baseline: str = None,
+                   tolerance: float = None, repeats: int = 3, seed: int = 0):
+    """
+    Runs the benchmark suite (see benchmarks.run_suite) and writes the json results
+    preset - quick or full (see benchmarks.PRESETS)
+    algo_names - algorithm name or list of names, all algorithms by default
+    out_file - json file for the results, data/out/benchmark.json by default
+    baseline - json results of the previous run to compare with
+    tolerance - relative change treated as a regression, benchmarks.TOLERANCE if None
+    repeats - each result is the best of repeats runs
+    Returns the regressions
+    """
+    from scheduler import benchmarks
+    from scheduler.benchmarks import PRESETS, TOLERANCE
+    from scheduler.methods import METHODS
+
+    if tolerance is None:
+        tolerance = TOLERANCE
+    if preset not in PRESETS:
+        logger.critical("Unknown preset: " + preset)
+        return []
+    if algo_names is not None and not isinstance(algo_names, (list, tuple)):
+        algo_names = [algo_names]
+    for algo_name in algo_names or []:
+        if algo_name not in METHODS:
+            logger.critical("Unknown algorithm: " + algo_name)
+            return []
+
+    results = benchmarks.run_suite(preset, algo_names, repeats, seed)
+    if out_file is None:
+        out_file = InputParser.get_project_dir() + OUT_DIR + "benchmark.json"
+    benchmarks.save(results, out_file)
+    logger.info("{} results written to {}".format(len(results["results"]), out_file))
+    if baseline is None:
+        return []
+
+    regressions = benchmarks.compare(results, benchmarks.load(baseline), tolerance)
+    for reg in regressions:
+        logger.warning("Regression {}: {:.4g} -> {:.4g} ({:+.1%})".format(
+            reg["name"], reg["baseline"], reg["current"], reg["change"]
+        ))
+    if len(regressions) == 0:
+        logger.info("No regressions against " + baseline)
+    return regressions
+
+def benchmark():
+    fire.Fire(benchmark_impl)
+
+def serve_impl(algo_name: str, file_tag, servers: int = 1, host: str = "127.0.0.1", port: int = None,
+               unix: str = None, config: str = None):
+    """
+    Serves live decisions of the algorithm (see service.DispatchService)
+    on the TCP port, the Unix socket or stdin and stdout if both are None
+    file_tag - tag of the input files with change_times and work_times
+    servers - number of servers
+    config - json file with the hyperparameters of the algorithm
+    """
+    import asyncio
+    from scheduler.methods import METHODS
+    from scheduler.service import DispatchService
+
+    if algo_name not in METHODS:
+        logger.critical("Unknown algorithm: " + algo_name)
+        return
+    if config is not None and METHODS[algo_name].CONFIG is None:
+        logger.critical("Algorithm " + algo_name + " has no hyperparameters")
+        return
+
+    ina = InputParser.by_tag(file_tag, False, False)
+    if config is not None:
+        met = METHODS[algo_name](ina, METHODS[algo_name].CONFIG.load(config))
+    else:
+        met = METHODS[algo_name](ina)
+    service = DispatchService(met, len(ina.work_times), servers)
+    asyncio.run(service.serve(host, port, unix))
+
+def serve():
+    fire.Fire(serve_impl)
+
+def load_gen_impl(file_tag, speedup: float = None, host: str = "127.0.0.1", port: int = None, unix: str = None,
+                  timeout: float = None, lockstep=False):
+    """
+    Replays arrivals of file_tag against the running serve and reports the
+    throughput and the decision latency (see service.replay)
+    speedup - time units of the arrivals per second, as fast as possible if None
+    timeout - seconds to wait for each reply of the service, no limit if None
+    lockstep - replay in simulated time with the decisions of the Solver,
+        the results are reported as by run_algo
+    """
+    import asyncio
+    from scheduler.service import replay
+
+    if port is None and unix is None:
+        logger.critical("port or unix must be set")
+        return None
+    ina = InputParser.by_tag(file_tag, False)
+    res = asyncio.run(replay(ina.arrivals, ina.change_times, ina.work_times, speedup, host, port, unix, timeout,
+                             lockstep))
+    logger.info("{} notifications in {:.2f} s: {:.0f} per second, decision p50 {:.1f} us, p99 {:.1f} us".format(
+        res["notifications"], res["seconds"], res["throughput"], res.get("p50_us", 0), res.get("p99_us", 0)))
+    if lockstep:
+        logger.info("Results: " + str(res["results"]))
+    return res
+
+def load_gen():
+    fire.Fire(load_gen_impl)
+
 def profiler():
     prof = cProfile.Profile()
     prof.enable()
@@ -0,0 +1,132 @@
+from array import array
+
+import numpy as np
+
+
+class QueuesSeries:
+    """
+    Queue lengths over time as a step function
+
+    Only change points are stored: the queue queues[i] has length counts[i]
+    from times[i] until its next change point. Queues without change
+    points have length 0
+    """
+    VERSION = 1
+
+    num_queues_: int
+    # time of the last event
+    end_: int
+    times_ : np.ndarray
+    queues_: np.ndarray
+    counts_: np.ndarray
+
+    def __init__(self, num_queues: int, end: int, times, queues, counts):
+        self.num_queues_ = num_queues
+        self.end_ = end
+        self.times_ = np.asarray(times, dtype=np.int64)
+        self.queues_ = np.asarray(queues, dtype=np.int64)
+        self.counts_ = np.asarray(counts, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.times_)
+
+    def __repr__(self) -> str:
+        return "QueuesSeries(num_queues={}, end={}, change_points={})".format(
+            self.num_queues_, self.end_, len(self)
+        )
+
+    @property
+    def num_queues(self) -> int:
+        return self.num_queues_
+
+    @property
+    def end(self) -> int:
+        return self.end_
+
+    def resample(self, step: int = 1, start: int = 0, end: int = None) -> tuple:
+        """
+        Returns (times, counts), where times = range(start, end + 1, step)
+        and counts[i][q] is the length of the queue q at times[i] before
+        the events at this time, as in the former Events.queues_distrib
+        """
+        if end is None:
+            end = self.end_
+        times = np.arange(start, end + 1, step, dtype=np.int64)
+        counts = np.zeros((len(times), self.num_queues_), dtype=np.int64)
+        for q in range(self.num_queues_):
+            mask = self.queues_ == q
+            q_times = self.times_[mask]
+            if len(q_times) == 0:
+                continue
+            q_counts = self.counts_[mask]
+            idx = np.searchsorted(q_times, times, side='left') - 1
+            counts[:, q] = np.where(idx >= 0, q_counts[np.maximum(idx, 0)], 0)
+        return times, counts
+
+    def save(self, filename: str):
+        """
+        Writes series to the .npz file
+        """
+        with open(filename, 'wb') as file:
+            np.savez(
+                file,
+                version=QueuesSeries.VERSION,
+                num_queues=self.num_queues_,
+                end=self.end_,
+                times=self.times_,
+                queues=self.queues_,
+                counts=self.counts_
+            )
+
+    @staticmethod
+    def load(filename: str):
+        """
+        Reads series written by save
+        """
+        with np.load(filename) as data:
+            version = int(data["version"])
+            assert version == QueuesSeries.VERSION, "Unsupported version " + str(version)
+            return QueuesSeries(
+                int(data["num_queues"]),
+                int(data["end"]),
+                data["times"],
+                data["queues"],
+                data["counts"]
+            )
+
+
+class QueuesSeriesBuilder:
+    """
+    Collects change points of the queue lengths in compact buffers
+    """
+    num_queues_: int
+    times_ : array
+    queues_: array
+    counts_: array
+
+    def __init__(self, num_queues: int):
+        self.num_queues_ = num_queues
+        self.times_ = array('q')
+        self.queues_ = array('q')
+        self.counts_ = array('q')
+
+    def add(self, timestamp: int, qnumber: int, count: int):
+        """
+        Queue qnumber has count elements since timestamp
+        """
+        # Several changes of the same queue in one timestamp
+        if len(self.times_) != 0 and self.times_[-1] == timestamp and self.queues_[-1] == qnumber:
+            self.counts_[-1] = count
+            return
+        self.times_.append(timestamp)
+        self.queues_.append(qnumber)
+        self.counts_.append(count)
+
+    def build(self, end: int) -> QueuesSeries:
+        return QueuesSeries(
+            self.num_queues_,
+            end,
+            np.frombuffer(self.times_, dtype=np.int64),
+            np.frombuffer(self.queues_, dtype=np.int64),
+            np.frombuffer(self.counts_, dtype=np.int64)
+        )
@@ -0,0 +1,469 @@
+import os
+import sys
+import json
+import time
+import heapq
+import signal
+import asyncio
+import logging
+
+from collections import deque
+
+import numpy as np
+
+from scheduler.logging_utils import get_default_logger
+from scheduler.methods import MBase
+from scheduler.queue_state import QueueState
+from scheduler.statistics import Statistics, default_accumulators
+
+logger = get_default_logger(__name__)
+logger.setLevel(logging.INFO)
+
+# Notifications and replies, one json object per line:
+# {"type": "arrive", "queue": q} - new task in the queue q
+# {"type": "done", "server": s}  - the server s finished its task
+# {"type": "stats"}              - request of the service statistics
+# {"type": "dispatch", "server": s, "queue": q} - the server s takes a task from the queue q
+# {"type": "error", "message": text} - the notification is rejected or the method failed
+ARRIVE = "arrive"
+DONE = "done"
+STATS = "stats"
+DISPATCH = "dispatch"
+ERROR = "error"
+
+
+class DispatchService:
+    """
+    Live decisions of a method: the state of queues and servers is the
+    same as in the Solver, but it is changed by notifications of clients.
+
+    Notifications received while the previous batch is processed form
+    one batch: finished servers are unloaded, then arrivals are added,
+    then free servers are loaded.
+
+    The service is meant for one client, which reports arrivals and runs
+    all servers: dispatches are not addressed and are sent to every
+    connected client. Other connections (e.g. stats requests) see them too
+    """
+    # Number of the latest decisions used for the latency percentiles
+    LATENCY_WINDOW = 1 << 16
+
+    method_    : MBase
+    queues_    : QueueState
+    busy_      : list[bool]
+    # Heap of the free servers, the lowest number is loaded first
+    free_      : list[int]
+    last_queue_: list[int]
+
+    # Durations of the latest method_.load calls in nanoseconds
+    latencies_ : deque
+    decisions_ : int
+    batches_   : int
+    # (message, writer) from all clients
+    inbox_     : asyncio.Queue
+    writers_   : set
+
+    def __init__(self, met: MBase, num_queues: int, servers: int = 1):
+        assert servers >= 1
+        self.method_ = met
+        self.queues_ = QueueState.zeros(num_queues)
+        self.busy_ = [False] * servers
+        self.free_ = list(range(servers))
+        self.last_queue_ = [0] * servers
+        self.latencies_ = deque(maxlen=DispatchService.LATENCY_WINDOW)
+        self.decisions_ = 0
+        self.batches_ = 0
+        self.inbox_ = None
+        self.writers_ = set()
+
+    def stats(self) -> dict:
+        res = {
+            "type": STATS,
+            "decisions": self.decisions_,
+            "batches": self.batches_,
+            "waiting": self.queues_.total(),
+            "busy": sum(self.busy_),
+            "servers": len(self.busy_)
+        }
+        if len(self.latencies_) != 0:
+            latencies = np.array(self.latencies_) / 1000
+            res["p50_us"] = float(np.percentile(latencies, 50))
+            res["p99_us"] = float(np.percentile(latencies, 99))
+        return res
+
+    def check_(self, message: dict) -> str:
+        """
+        Returns the error of the notification or None
+        """
+        mtype = message.get("type")
+        if mtype == ARRIVE:
+            queue = message.get("queue")
+            if not isinstance(queue, int) or not 0 <= queue < len(self.queues_):
+                return "Unknown queue: " + str(queue)
+        elif mtype == DONE:
+            server = message.get("server")
+            if not isinstance(server, int) or not 0 <= server < len(self.busy_) or not self.busy_[server]:
+                return "Server is not busy: " + str(server)
+        elif mtype != STATS:
+            return "Unknown notification: " + str(mtype)
+        return None
+
+    def handle(self, messages: list[dict]) -> tuple[list[dict], list[tuple]]:
+        """
+        Applies the batch of notifications
+        Returns (dispatches, [(index of the message, reply)]), index is None
+        for the reply to all senders of the batch: the error of the method.
+        The batch is stopped by the error, servers without dispatches stay free
+        """
+        self.batches_ += 1
+        replies = []
+        done, arrivals, stats = [], [], []
+        for index, message in enumerate(messages):
+            error = self.check_(message)
+            if error is not None:
+                replies.append((index, {"type": ERROR, "message": error}))
+            elif message["type"] == DONE:
+                # Checked before the batch, a server may be reported twice
+                if self.busy_[message["server"]]:
+                    done.append(message["server"])
+                    self.busy_[message["server"]] = False
+            elif message["type"] == ARRIVE:
+                arrivals.append(message["queue"])
+            else:
+                stats.append(index)
+
+        for server in done:
+            heapq.heappush(self.free_, server)
+        dispatches = []
+        try:
+            # The same order as in the Solver calendar: unloads before arrivals
+            try:
+                for server in done:
+                    self.method_.unload(self.queues_, server)
+            finally:
+                # Arrivals are kept if the method fails
+                for queue in arrivals:
+                    self.queues_.add(queue)
+
+            while len(self.free_) != 0 and not self.queues_.is_empty():
+                server = self.free_[0]
+                start = time.perf_counter_ns()
+                queue = self.method_.load(self.queues_, self.last_queue_[server], server)
+                self.latencies_.append(time.perf_counter_ns() - start)
+                self.queues_.take(queue)
+                heapq.heappop(self.free_)
+                self.decisions_ += 1
+                self.busy_[server] = True
+                self.last_queue_[server] = queue
+                dispatches.append({"type": DISPATCH, "server": server, "queue": queue})
+        except Exception as error:
+            logger.exception("Method failed on the batch of {} notifications".format(len(messages)))
+            replies.append((None, {"type": ERROR, "message": "Method error: " + repr(error)}))
+
+        replies += [(index, self.stats()) for index in stats]
+        return dispatches, replies
+
+    async def process_(self):
+        while True:
+            batch = [await self.inbox_.get()]
+            while not self.inbox_.empty():
+                batch.append(self.inbox_.get_nowait())
+
+            try:
+                await self.write_(batch)
+            except Exception:
+                # Clients wait for the processor, it must not stop
+                logger.exception("Batch of {} notifications is lost".format(len(batch)))
+            finally:
+                for _ in batch:
+                    self.inbox_.task_done()
+
+    async def write_(self, batch: list[tuple]):
+        dispatches, replies = self.handle([message for message, _ in batch])
+        lines = "".join(json.dumps(msg) + "\n" for msg in dispatches).encode()
+        writers = set()
+        if len(lines) != 0:
+            for writer in self.writers_:
+                writer.write(lines)
+            writers |= self.writers_
+        for index, reply in replies:
+            line = (json.dumps(reply) + "\n").encode()
+            # Each sender gets one reply for the whole batch
+            senders = {batch[index][1]} if index is not None else {writer for _, writer in batch}
+            for writer in senders:
+                writer.write(line)
+            writers |= senders
+        for writer in writers:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self.writers_.discard(writer)
+
+    async def client_(self, reader: asyncio.StreamReader, writer):
+        if len(self.writers_) != 0:
+            logger.warning("Another client is connected, dispatches are sent to all clients")
+        self.writers_.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+                if line.strip() == b"":
+                    continue
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    message = {"type": None}
+                if not isinstance(message, dict):
+                    message = {"type": None}
+                await self.inbox_.put((message, writer))
+        finally:
+            # Replies to the last notifications
+            await self.inbox_.join()
+            self.writers_.discard(writer)
+            writer.close()
+
+    async def serve(self, host: str = None, port: int = None, unix: str = None):
+        """
+        Serves clients on the TCP port, the Unix socket or stdin and stdout
+        if both are None, until SIGINT or SIGTERM or the end of stdin
+        """
+        self.inbox_ = asyncio.Queue()
+        processor = asyncio.create_task(self.process_())
+        try:
+            if port is not None:
+                server = await asyncio.start_server(self.client_, host, port)
+            elif unix is not None:
+                server = await asyncio.start_unix_server(self.client_, unix)
+            else:
+                reader = asyncio.StreamReader()
+                loop = asyncio.get_running_loop()
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+                await self.client_(reader, StdoutWriter_())
+                return
+
+            logger.info("Serving on " + (unix if port is None else "{}:{}".format(host, port)))
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, stop.set)
+            async with server:
+                await stop.wait()
+        finally:
+            processor.cancel()
+            if unix is not None and os.path.exists(unix):
+                os.remove(unix)
+            logger.info("Stats: " + json.dumps(self.stats()))
+
+
+class StdoutWriter_:
+    """
+    Writer of the stdin client with the StreamWriter interface
+    """
+
+    def write(self, data: bytes):
+        sys.stdout.buffer.write(data)
+
+    async def drain(self):
+        sys.stdout.buffer.flush()
+
+    def close(self):
+        sys.stdout.buffer.flush()
+
+
+async def replay(arrivals, change_times: list[list], work_times: list, speedup: float = None,
+                 host: str = None, port: int = None, unix: str = None, timeout: float = None,
+                 lockstep=False) -> dict:
+    """
+    Load generator: sends arrivals to the DispatchService and reports
+    each dispatched task as done after its change and work time
+    speedup - time units per second, all notifications are sent at once if None
+    arrivals - iterable of (timestamp, queue number) sorted by timestamp
+    timeout - seconds to wait for each reply of the service, no limit if None
+    lockstep - send notifications one at a time in the order of the Solver
+        calendar in simulated time, each after the replies to the previous
+        one, so the service makes the same decisions as the Solver with
+        the same method. speedup is not used
+    Returns the service stats with "notifications", "seconds" and "throughput"
+    (notifications per second), with lockstep also "results": statistics of
+    the simulated run as Solver.results
+    Raises RuntimeError if the service rejects a notification or closes the
+    connection, asyncio.TimeoutError if it does not reply in timeout
+    """
+    if port is not None:
+        reader, writer = await asyncio.open_connection(host, port)
+    else:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        if lockstep:
+            res, sent = await replay_lockstep_(reader, writer, arrivals, change_times, work_times, timeout)
+        else:
+            res, sent = await replay_(reader, writer, arrivals, change_times, work_times, speedup, timeout)
+    finally:
+        writer.close()
+    seconds = loop.time() - start
+    res["notifications"] = 2 * sent
+    res["seconds"] = seconds
+    res["throughput"] = 2 * sent / seconds
+    return res
+
+
+def send_(writer, message: dict):
+    writer.write((json.dumps(message) + "\n").encode())
+
+
+async def replay_(reader, writer, arrivals, change_times: list[list], work_times: list, speedup: float,
+                  timeout: float) -> tuple[dict, int]:
+    """
+    replay with a concurrent receiver, returns (stats, number of arrivals)
+    """
+    loop = asyncio.get_running_loop()
+    last_queue = {}
+    sent, finished = 0, 0
+    all_sent = asyncio.Event()
+    all_done = asyncio.Event()
+    stats = loop.create_future()
+
+    def fail(error: Exception):
+        if not stats.done():
+            stats.set_exception(error)
+        all_done.set()
+
+    def done(server: int):
+        nonlocal finished
+        send_(writer, {"type": DONE, "server": server})
+        finished += 1
+        if all_sent.is_set() and finished == sent:
+            all_done.set()
+
+    async def receive():
+        while True:
+            try:
+                line = await reader.readline()
+            except ConnectionError:
+                line = b""
+            if len(line) == 0:
+                fail(RuntimeError("Service closed the connection"))
+                break
+            message = json.loads(line)
+            if message["type"] == DISPATCH:
+                server, queue = message["server"], message["queue"]
+                duration = change_times[last_queue.get(server, 0)][queue] + work_times[queue]
+                last_queue[server] = queue
+                if speedup is None:
+                    done(server)
+                else:
+                    loop.call_later(duration / speedup, done, server)
+            elif message["type"] == STATS:
+                stats.set_result(message)
+            else:
+                # The rejected arrival is never dispatched
+                fail(RuntimeError("Service error: " + message.get("message", "")))
+                break
+
+    receiver = asyncio.create_task(receive())
+    try:
+        start = loop.time()
+        lines = []
+        for timestamp, queue in arrivals:
+            if speedup is not None:
+                delay = start + timestamp / speedup - loop.time()
+                if delay > 0:
+                    # Arrivals with the same time are sent together
+                    writer.write("".join(lines).encode())
+                    lines = []
+                    await writer.drain()
+                    await asyncio.sleep(delay)
+            lines.append(json.dumps({"type": ARRIVE, "queue": queue}) + "\n")
+            sent += 1
+            if len(lines) >= 1024:
+                writer.write("".join(lines).encode())
+                lines = []
+                await writer.drain()
+        writer.write("".join(lines).encode())
+        await writer.drain()
+
+        all_sent.set()
+        if finished == sent:
+            all_done.set()
+        await asyncio.wait_for(all_done.wait(), timeout)
+        # Otherwise it has the error of receive
+        if not stats.done():
+            send_(writer, {"type": STATS})
+            await writer.drain()
+        res = dict(await asyncio.wait_for(stats, timeout))
+    finally:
+        receiver.cancel()
+    return res, sent
+
+
+async def replay_lockstep_(reader, writer, arrivals, change_times: list[list], work_times: list,
+                           timeout: float) -> tuple[dict, int]:
+    """
+    replay in simulated time, returns (stats with "results", number of arrivals)
+    """
+
+    async def request(message: dict) -> tuple[list[dict], dict]:
+        """
+        Sends the notification and returns (dispatches, stats) after it
+        """
+        if message is not None:
+            send_(writer, message)
+        send_(writer, {"type": STATS})
+        await writer.drain()
+        dispatches = []
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+            except ConnectionError:
+                line = b""
+            if len(line) == 0:
+                raise RuntimeError("Service closed the connection")
+            reply = json.loads(line)
+            if reply["type"] == DISPATCH:
+                dispatches.append(reply)
+            elif reply["type"] == STATS:
+                return dispatches, reply
+            else:
+                raise RuntimeError("Service error: " + reply.get("message", ""))
+
+    _, reply = await request(None)
+    servers = reply["servers"]
+    stats = Statistics(len(work_times), default_accumulators(servers), servers)
+    last_queue = [0] * servers
+    # Heap of (time, number of the dispatch, server, queue) of the busy servers
+    unloads = []
+    dispatched = 0
+
+    async def notify(timestamp: int, message: dict):
+        nonlocal dispatched
+        dispatches, _ = await request(message)
+        for dispatch in dispatches:
+            server, queue = dispatch["server"], dispatch["queue"]
+            stats.load(timestamp, queue, last_queue[server] != queue, server)
+            end = timestamp + change_times[last_queue[server]][queue] + work_times[queue]
+            heapq.heappush(unloads, (end, dispatched, server, queue))
+            dispatched += 1
+            last_queue[server] = queue
+
+    async def unload_until(timestamp):
+        # Unloads are before arrivals with the same time, as in the calendar
+        while len(unloads) != 0 and (timestamp is None or unloads[0][0] <= timestamp):
+            end, _, server, queue = heapq.heappop(unloads)
+            stats.unload(end, queue, server)
+            await notify(end, {"type": DONE, "server": server})
+
+    sent = 0
+    for timestamp, queue in arrivals:
+        await unload_until(timestamp)
+        stats.arrive(timestamp, queue)
+        await notify(timestamp, {"type": ARRIVE, "queue": queue})
+        sent += 1
+    await unload_until(None)
+
+    _, res = await request(None)
+    res = dict(res)
+    res["results"] = stats.results()
+    return res, sent
@@ -1,84 +1,304 @@
+import heapq
+import time
+import random
+
+from typing import Callable, Iterable
+
+from scheduler import checkpoint
+from scheduler.checkpoint import CheckpointWriter
 from scheduler.events import Event, Events
 from scheduler.input_parser import InputParser
 from scheduler.methods import MBase
+from scheduler.metrics import Metrics
+from scheduler.queue_state import QueueState
+from scheduler.series import QueuesSeries
+from scheduler.statistics import Accumulator, QueuesDistrib, Statistics, default_accumulators
 
 class Solver:
     change_times_: list[list]
     work_times_  : list
     events_      : Events
-    busy_        : bool
+    # busy_[i] is True if the server i is processing a task
+    busy_        : list[bool]
+    # Heap of the free servers, the lowest number is loaded first
+    free_        : list[int]
 
-    # number of the last queue being in processed
-    last_queue_  : int
+    # number of the last queue being in processed by each server
+    last_queue_  : list[int]
     method_      : MBase
 
-    # The number of items in each queue
-    queues_: list
+    # The number of waiting (not loaded) items in each queue
+    queues_: QueueState
+
+    # Streaming statistics of the run
+    stats_  : Statistics
+    distrib_: QueuesDistrib
+
+    # method_.load and method_.unload, timed if metrics are collected
+    load_  : Callable
+    unload_: Callable
 
-    def __init__(self, ip: InputParser, met: MBase):
-        self.arrivals_ = ip.arrivals
+    # Arrivals with the same timestamp are one event, no LOAD events
+    coalesce_      : bool
+
+    # Instrumentation, None if disabled
+    metrics_       : Metrics
+    metrics_every_ : int
+    metrics_file_  : str
+
+    # Periodic checkpoints, None if disabled
+    checkpoint_      : CheckpointWriter
+    checkpoint_every_: int
+
+    def __init__(self, ip: InputParser, met: MBase, accumulators: list[Accumulator] = None, keep_distrib=True,
+                 arrivals: Iterable = None, metrics: Metrics = None, metrics_every: int = None,
+                 metrics_file: str = None, servers: int = 1, coalesce=False, checkpoint_every: int = None,
+                 checkpoint_file: str = None, resume: str = None):
+        """
+        accumulators - statistics collected during the run,
+            default_accumulators(servers) if None
+        keep_distrib - collect queue lengths over time, required by run.
+            Its size grows with the number of arrivals
+        arrivals - iterable of (timestamp, queue number) sorted by timestamp,
+            ip.arrivals if None. It is consumed lazily: only the next arrival
+            is kept in the calendar, so it can be an unbounded generator
+        metrics - collect event counters, durations of method_.load and
+            method_.unload and gauges of the method (see MBase.instrument).
+            Without metrics the run is not slowed down
+        metrics_every - sample gauges and write metrics_file each
+            metrics_every events, only at the end of simulate if None
+        metrics_file - file for metrics (see Metrics.write)
+        servers - number of parallel servers, each has its own last queue
+        coalesce - arrivals with the same timestamp are added to the calendar
+            as one ARRIVE_BATCH event and LOAD/LOAD_CH events are not added.
+            Statistics and decisions are the same, the calendar processes
+            about 2 events per task instead of 3
+        checkpoint_every - write the state of the run to checkpoint_file each
+            checkpoint_every events (see checkpoint.py), in the background.
+            simulate returns after the last write is finished
+        resume - checkpoint file to continue the run from. The run continues
+            exactly as without interruption: the calendar, queues, servers,
+            the method, statistics and the random state are restored.
+            arrivals must be the same and iterable again, met must have the
+            same type (its state is replaced), accumulators and keep_distrib
+            of the checkpointed run are used. Metrics count only the events
+            after the resume
+        """
+        assert servers >= 1
+        if arrivals is None:
+            arrivals = ip.arrivals
+        self.arrivals_ = arrivals
         self.change_times_ = ip.change_times
         self.work_times_ = ip.work_times
-        self.busy_ = False
-        self.last_queue_ = 0
+        self.busy_ = [False] * servers
+        self.free_ = list(range(servers))
+        self.last_queue_ = [0] * servers
         self.events_ = Events()
         self.method_ = met
-        self.events_.arrives(self.arrivals_)
-        self.queues_ = [0] * len(self.work_times_)
+        self.coalesce_ = coalesce
+        self.events_.arrives(self.arrivals_, coalesce)
+        self.queues_ = QueueState.zeros(len(self.work_times_))
+        if accumulators is None:
+            accumulators = default_accumulators(servers)
+        self.distrib_ = None
+        if keep_distrib:
+            self.distrib_ = QueuesDistrib()
+            accumulators = accumulators + [self.distrib_]
+        self.stats_ = Statistics(len(self.work_times_), accumulators, servers)
+        self.metrics_ = metrics
+        if resume is not None:
+            self.restore_(resume)
+
+        self.checkpoint_every_ = checkpoint_every
+        self.checkpoint_ = None
+        if checkpoint_every is not None:
+            assert checkpoint_file is not None, "checkpoint_every requires checkpoint_file"
+            self.checkpoint_ = CheckpointWriter(checkpoint_file)
+
+        self.load_ = self.method_.load
+        self.unload_ = self.method_.unload
+        self.metrics_every_ = metrics_every
+        self.metrics_file_ = metrics_file
+        if metrics is not None:
+            self.load_ = timed_(self.load_, metrics.histogram("load_seconds"))
+            self.unload_ = timed_(self.unload_, metrics.histogram("unload_seconds"))
+            self.method_.instrument(metrics)
+
+    def simulate(self, until: int = None):
+        """
+        Processes all events with timestamp <= until (all events if None)
+        """
+        if self.metrics_ is not None or self.checkpoint_ is not None:
+            self.simulate_instrumented_(until)
+            return
+
+        while self.events_.size() != 0:
+            if until is not None and self.events_.next_timestamp() > until:
+                return
+            ev = self.events_.get()
+            self.solve_(ev)
 
-    def run(self) -> str:
+    def simulate_instrumented_(self, until: int = None):
+        """
+        simulate with metrics and checkpoints
+        """
+        metrics = self.metrics_
+        counted = 0
+        timestamp = 0
         while self.events_.size() != 0:
+            if until is not None and self.events_.next_timestamp() > until:
+                break
             ev = self.events_.get()
+            if metrics is not None:
+                metrics.inc("events_total", 1, (("type", ev.type),))
             self.solve_(ev)
-        out  = "time : event   queue num   queues\n"
-        out += self.events_.history()
-        print(self.events_.stats())
+
+            timestamp = ev.timestamp
+            counted += 1
+            if metrics is not None and self.metrics_every_ is not None and counted % self.metrics_every_ == 0:
+                self.export_metrics_(timestamp)
+            if self.checkpoint_ is not None and counted % self.checkpoint_every_ == 0:
+                self.checkpoint_.write(self.state_(), {"metrics": self.metrics_})
+        if metrics is not None:
+            self.export_metrics_(timestamp)
+        if self.checkpoint_ is not None:
+            # The writer thread is not kept between simulate calls
+            self.checkpoint_.close()
+
+    def state_(self) -> dict:
+        """
+        Returns the state of the run for the checkpoint
+        """
+        return {
+            "events": self.events_,
+            "queues": self.queues_,
+            "busy": self.busy_,
+            "free": self.free_,
+            "last_queue": self.last_queue_,
+            "method": self.method_,
+            "stats": self.stats_,
+            "distrib": self.distrib_,
+            "random": random.getstate(),
+            "coalesce": self.coalesce_
+        }
+
+    def restore_(self, filename: str):
+        # The method is connected to the metrics of this run
+        state = checkpoint.read(filename, {"metrics": self.metrics_})
+        assert type(state["method"]) is type(self.method_), \
+            "Checkpoint of {}, expected {}".format(type(state["method"]).__name__, type(self.method_).__name__)
+        assert len(state["busy"]) == len(self.busy_), "Checkpoint has {} servers".format(len(state["busy"]))
+        assert state["coalesce"] == self.coalesce_, "Checkpoint has coalesce={}".format(state["coalesce"])
+        self.events_ = state["events"]
+        self.events_.resume_arrivals(self.arrivals_)
+        self.queues_ = state["queues"]
+        self.busy_ = state["busy"]
+        self.free_ = state["free"]
+        self.last_queue_ = state["last_queue"]
+        self.method_ = state["method"]
+        self.stats_ = state["stats"]
+        self.distrib_ = state["distrib"]
+        random.setstate(state["random"])
+
+    def checkpoint(self, filename: str):
+        """
+        Writes the state of the run to the file now (see resume of __init__)
+        """
+        checkpoint.write(filename, self.state_(), {"metrics": self.metrics_})
+
+    def export_metrics_(self, timestamp: int):
+        self.metrics_.sample(timestamp)
+        if self.metrics_file_ is not None:
+            self.metrics_.write(self.metrics_file_)
+
+    @property
+    def method(self) -> MBase:
+        return self.method_
+
+    def results(self) -> dict:
+        """
+        Returns statistics of the processed events, see Statistics.results
+        """
+        return self.stats_.results()
+
+    def run(self) -> QueuesSeries:
+        assert self.distrib_ is not None, "run requires keep_distrib"
+        self.simulate()
+        results = self.results()
+        hist_queues = results.pop(QueuesDistrib.name)
+        print(results)
         self.method_.end()
-        return self.events_.queues_distrib()
+        return hist_queues
 
     def solve_(self, event: Event):
         curtime = event.timestamp
         if event.type == Event.ARRIVE:
-            self.queues_[event.qnumber] += 1
-            if self.busy_:
-                return
+            self.arrive_(event.qnumber, curtime)
+            return
 
-            qnum = self.method_.load(self.queues_, self.last_queue_)
-            self.start_task_(qnum, curtime)
-            self.busy_ = True
+        if event.type == Event.ARRIVE_BATCH:
+            # Decisions of free servers depend on the order of arrivals
+            for qnumber in event.qnumbers:
+                self.arrive_(qnumber, curtime)
             return
 
+        # The server state is set when the task is started
         if event.type == Event.LOAD_CH:
-            self.busy_ = True
-            self.last_queue_ = event.qnumber
             return
 
         if event.type == Event.LOAD:
-            self.busy_ = True
-            self.last_queue_ = event.qnumber
             return
 
         if event.type == Event.UNLOAD:
-            self.busy_ = False
-            self.queues_[event.qnumber] -= 1
-            self.method_.unload(self.queues_)
-            if max(self.queues_) == 0:
+            server = event.server
+            self.stats_.unload(curtime, event.qnumber, server)
+            self.busy_[server] = False
+            self.unload_(self.queues_, server)
+            if self.queues_.is_empty():
+                heapq.heappush(self.free_, server)
                 return
 
-            qnum = self.method_.load(self.queues_, self.last_queue_)
-            self.start_task_(qnum, curtime)
-            self.busy_ = True
+            qnum = self.load_(self.queues_, self.last_queue_[server], server)
+            self.start_task_(qnum, curtime, server)
             return
 
         assert 0, "Unknwown event_type = " + event.type
 
-    def start_task_(self, qnum: int, curtime: int):
-        time_change = self.change_times_[self.last_queue_][qnum]
+    def arrive_(self, qnumber: int, curtime: int):
+        self.stats_.arrive(curtime, qnumber)
+        self.queues_.add(qnumber)
+        if len(self.free_) == 0:
+            return
+
+        server = heapq.heappop(self.free_)
+        qnum = self.load_(self.queues_, self.last_queue_[server], server)
+        self.start_task_(qnum, curtime, server)
+
+    def start_task_(self, qnum: int, curtime: int, server: int):
+        last_queue = self.last_queue_[server]
+        time_change = self.change_times_[last_queue][qnum]
         time_work = self.work_times_[qnum]
+        self.stats_.load(curtime, qnum, last_queue != qnum, server)
+        self.queues_.take(qnum)
+        self.busy_[server] = True
+        self.last_queue_[server] = qnum
 
-        if self.last_queue_ != qnum:
-            self.events_.load_ch(curtime, qnum)
+        if self.coalesce_:
+            pass
+        elif last_queue != qnum:
+            self.events_.load_ch(curtime, qnum, server)
         else:
-            self.events_.load(curtime, qnum)
+            self.events_.load(curtime, qnum, server)
+
+        self.events_.unload(curtime + time_change + time_work, qnum, server)
 
-        self.events_.unload(curtime + time_change + time_work, qnum)
+def timed_(func: Callable, hist) -> Callable:
+    """
+    Returns func, which duration is observed in the histogram
+    """
+    def timed(*args):
+        start = time.perf_counter()
+        res = func(*args)
+        hist.observe(time.perf_counter() - start)
+        return res
+    return timed
@@ -0,0 +1,229 @@
+from abc import ABC, abstractmethod
+
+from scheduler.series import QueuesSeries, QueuesSeriesBuilder
+
+
+class Accumulator(ABC):
+    """
+    Streaming statistic, updated by the Solver on each processed event
+
+    All hooks receive the number of waiting tasks in each queue BEFORE
+    the event is applied. Timestamps are not decreasing
+    """
+    name: str
+
+    def start(self, num_queues: int, num_servers: int = 1):
+        """
+        Executed before the first event
+        """
+        pass
+
+    def arrive(self, timestamp: int, qnumber: int, queues: list):
+        """
+        New task arrived in the queue qnumber
+        """
+        pass
+
+    def load(self, timestamp: int, qnumber: int, changed: bool, queues: list, server: int = 0):
+        """
+        Task from the queue qnumber is loaded to the server. changed is
+        True if the server switched from another queue
+        """
+        pass
+
+    def unload(self, timestamp: int, qnumber: int, queues: list, server: int = 0):
+        """
+        Task from the queue qnumber is done by the server
+        """
+        pass
+
+    @abstractmethod
+    def result(self, timestamp: int, queues: list):
+        """
+        Returns the statistic at the end of the run
+        timestamp - time of the last event
+        """
+        pass
+
+
+class MeanQueues(Accumulator):
+    """
+    Time-weighted mean length of each queue
+    """
+    name = "mean_queues"
+
+    # integral of the queue length over time
+    area_: list
+    # time of the last change of each queue
+    last_change_: list
+
+    def start(self, num_queues, num_servers=1):
+        self.area_ = [0] * num_queues
+        self.last_change_ = [0] * num_queues
+
+    def change_(self, timestamp, qnumber, queues):
+        self.area_[qnumber] += queues[qnumber] * (timestamp - self.last_change_[qnumber])
+        self.last_change_[qnumber] = timestamp
+
+    def arrive(self, timestamp, qnumber, queues):
+        self.change_(timestamp, qnumber, queues)
+
+    def load(self, timestamp, qnumber, changed, queues, server=0):
+        self.change_(timestamp, qnumber, queues)
+
+    def result(self, timestamp, queues):
+        if timestamp == 0:
+            return [0.0] * len(queues)
+        return [
+            (area + length * (timestamp - last)) / timestamp
+            for area, length, last in zip(self.area_, queues, self.last_change_)
+        ]
+
+
+class MaxQueues(Accumulator):
+    """
+    Maximum length of each queue
+    """
+    name = "max_queues"
+
+    max_: list
+
+    def start(self, num_queues, num_servers=1):
+        self.max_ = [0] * num_queues
+
+    def arrive(self, timestamp, qnumber, queues):
+        if queues[qnumber] + 1 > self.max_[qnumber]:
+            self.max_[qnumber] = queues[qnumber] + 1
+
+    def result(self, timestamp, queues):
+        return self.max_
+
+
+class Utilisation(Accumulator):
+    """
+    Share of time the servers are busy (including change times),
+    mean over all servers
+    """
+    name = "utilisation"
+
+    # Busy time and the start of the current task of each server
+    busy_time_: list
+    busy_since_: list
+
+    def start(self, num_queues, num_servers=1):
+        self.busy_time_ = [0] * num_servers
+        self.busy_since_ = [0] * num_servers
+
+    def load(self, timestamp, qnumber, changed, queues, server=0):
+        self.busy_since_[server] = timestamp
+
+    def unload(self, timestamp, qnumber, queues, server=0):
+        self.busy_time_[server] += timestamp - self.busy_since_[server]
+
+    def result(self, timestamp, queues):
+        if timestamp == 0:
+            return 0.0
+        return sum(self.busy_time_) / (len(self.busy_time_) * timestamp)
+
+
+class ServersUtilisation(Utilisation):
+    """
+    Share of time each server is busy
+    """
+    name = "servers_utilisation"
+
+    def result(self, timestamp, queues):
+        if timestamp == 0:
+            return [0.0] * len(self.busy_time_)
+        return [busy / timestamp for busy in self.busy_time_]
+
+
+class Switches(Accumulator):
+    """
+    Number of the server switches between queues
+    """
+    name = "switches"
+
+    switches_: int
+
+    def start(self, num_queues, num_servers=1):
+        self.switches_ = 0
+
+    def load(self, timestamp, qnumber, changed, queues, server=0):
+        if changed:
+            self.switches_ += 1
+
+    def result(self, timestamp, queues):
+        return self.switches_
+
+
+class QueuesDistrib(Accumulator):
+    """
+    Queue lengths over time, stored as change points (see QueuesSeries)
+    """
+    name = "queues_distrib"
+
+    builder_: QueuesSeriesBuilder
+
+    def start(self, num_queues, num_servers=1):
+        self.builder_ = QueuesSeriesBuilder(num_queues)
+
+    def arrive(self, timestamp, qnumber, queues):
+        self.builder_.add(timestamp, qnumber, queues[qnumber] + 1)
+
+    def load(self, timestamp, qnumber, changed, queues, server=0):
+        self.builder_.add(timestamp, qnumber, queues[qnumber] - 1)
+
+    def result(self, timestamp, queues) -> QueuesSeries:
+        return self.builder_.build(timestamp)
+
+
+def default_accumulators(num_servers: int = 1) -> list[Accumulator]:
+    accumulators = [MeanQueues(), MaxQueues(), Utilisation(), Switches()]
+    if num_servers > 1:
+        accumulators.append(ServersUtilisation())
+    return accumulators
+
+
+class Statistics:
+    """
+    Keeps the number of waiting tasks in each queue and feeds the accumulators
+    """
+    # The number of waiting (not loaded) tasks in each queue
+    queues_: list
+    # Time of the last event
+    timestamp_: int
+    accumulators_: list[Accumulator]
+
+    def __init__(self, num_queues: int, accumulators: list[Accumulator], num_servers: int = 1):
+        self.queues_ = [0] * num_queues
+        self.timestamp_ = 0
+        self.accumulators_ = accumulators
+        for acc in self.accumulators_:
+            acc.start(num_queues, num_servers)
+
+    def arrive(self, timestamp: int, qnumber: int):
+        self.timestamp_ = timestamp
+        for acc in self.accumulators_:
+            acc.arrive(timestamp, qnumber, self.queues_)
+        self.queues_[qnumber] += 1
+
+    def load(self, timestamp: int, qnumber: int, changed: bool, server: int = 0):
+        self.timestamp_ = timestamp
+        for acc in self.accumulators_:
+            acc.load(timestamp, qnumber, changed, self.queues_, server)
+        self.queues_[qnumber] -= 1
+
+    def unload(self, timestamp: int, qnumber: int, server: int = 0):
+        self.timestamp_ = timestamp
+        for acc in self.accumulators_:
+            acc.unload(timestamp, qnumber, self.queues_, server)
+
+    def results(self) -> dict:
+        """
+        Returns {accumulator name: result}
+        """
+        res = {"time": self.timestamp_}
+        for acc in self.accumulators_:
+            res[acc.name] = acc.result(self.timestamp_, self.queues_)
+        return res
@@ -0,0 +1,141 @@
+import itertools
+import logging
+import random
+
+from concurrent.futures import ProcessPoolExecutor
+
+from scheduler import batch
+from scheduler.input_parser import InputParser
+from scheduler.logging_utils import get_default_logger
+from scheduler.methods import BrainConfig, MBrainLike
+from scheduler.solver import Solver
+
+logger = get_default_logger(__name__)
+logger.setLevel(logging.INFO)
+
+# Search space of the BrainConfig hyperparameters:
+# list - values for grid and random search
+# tuple (low, high) - uniform range for random search
+DEFAULT_SPACE = {
+    "equal_threshold"    : (0.01, 0.3),
+    "similar_threshold"  : (0.05, 0.6),
+    "lambda_expovariate" : (0.5, 5.0),
+    "results_update_rate": (0.01, 0.5),
+    "beta"               : [1.0, 2.0]
+}
+
+GRID = "grid"
+RANDOM = "random"
+HALVING = "halving"
+
+
+def fix_(params: dict) -> dict:
+    """
+    Similar states must include equal ones
+    """
+    if "equal_threshold" in params and "similar_threshold" in params:
+        params["similar_threshold"] = max(params["similar_threshold"], params["equal_threshold"])
+    return params
+
+
+def grid_configs(space: dict) -> list[dict]:
+    """
+    Returns all combinations of the values, space must contain only lists
+    """
+    for name, values in space.items():
+        assert isinstance(values, list), "Grid search requires list of values for " + name
+    names = list(space)
+    return [fix_(dict(zip(names, values))) for values in itertools.product(*space.values())]
+
+
+def random_configs(space: dict, num_configs: int, rng: random.Random) -> list[dict]:
+    configs = []
+    for _ in range(num_configs):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                params[name] = rng.uniform(*values)
+            else:
+                params[name] = rng.choice(values)
+        configs.append(fix_(params))
+    return configs
+
+
+def evaluate_(params: dict, file_tag, seed: int, until: int) -> float:
+    """
+    Runs MBrainLike with params on the input until the time until
+    Returns the sum of mean queue lengths
+    """
+    random.seed(seed)
+    ina = batch.inputs_[file_tag]
+    sol = Solver(ina, MBrainLike(ina, BrainConfig(**params)), accumulators=None, keep_distrib=False,
+                 coalesce=True)
+    sol.simulate(until)
+    return sum(sol.results()["mean_queues"])
+
+
+def score_configs_(pool: ProcessPoolExecutor, configs: list[dict], horizons: dict, seeds: list, fraction: float) -> list[float]:
+    """
+    Returns mean score of each config over all inputs and seeds.
+    Only the first fraction of each input is simulated
+    """
+    futures = []
+    for params in configs:
+        for tag, horizon in horizons.items():
+            until = None if fraction >= 1 else int(horizon * fraction)
+            for seed in seeds:
+                futures.append(pool.submit(evaluate_, params, tag, seed, until))
+
+    runs = len(horizons) * len(seeds)
+    scores = [future.result() for future in futures]
+    return [sum(scores[i * runs:(i + 1) * runs]) / runs for i in range(len(configs))]
+
+
+def tune(file_tags: list, space: dict = None, search: str = HALVING, num_configs: int = 27,
+         seeds: list = (0,), eta: int = 3, min_fraction: float = 1 / 9, workers: int = None,
+         seed: int = 0) -> list[tuple]:
+    """
+    Searches MBrainLike hyperparameters minimizing the sum of mean queue lengths
+    Returns [(score, params)] sorted from the best, scores are from the last round
+
+    file_tags - tags of input files
+    space - search space, see DEFAULT_SPACE
+    search - GRID, RANDOM or HALVING (random configs and successive halving)
+    num_configs - number of random configs
+    seeds - seeds of each run
+    eta - HALVING keeps 1/eta of the best configs in each round and
+        simulates eta times longer part of the inputs
+    min_fraction - part of the inputs simulated in the first HALVING round
+    workers - number of processes, all cores if None
+    seed - seed of the random configs
+    """
+    assert search in (GRID, RANDOM, HALVING), "Unknown search: " + search
+    if space is None:
+        space = DEFAULT_SPACE
+
+    if search == GRID:
+        configs = grid_configs(space)
+    else:
+        configs = random_configs(space, num_configs, random.Random(seed))
+
+    inputs = {tag: InputParser.by_tag(tag, False) for tag in file_tags}
+    # Time of the last arrival
+    horizons = {tag: ina.arrivals[-1][0] for tag, ina in inputs.items()}
+
+    fraction = min_fraction if search == HALVING else 1
+    with batch.make_pool(inputs, workers) as pool:
+        while True:
+            scores = score_configs_(pool, configs, horizons, list(seeds), fraction)
+            ranked = sorted(zip(scores, configs), key=lambda elem: elem[0])
+            logger.info("{} configs on {:.0%} of inputs, best score {:.4f}".format(
+                len(configs), min(fraction, 1), ranked[0][0]
+            ))
+            if fraction >= 1:
+                return ranked
+
+            # Poor configs are stopped early
+            configs = [params for _, params in ranked[:max(1, len(configs) // eta)]]
+            fraction *= eta
+            # Floating point errors
+            if fraction > 0.999:
+                fraction = 1
@@ -0,0 +1,56 @@
+import pytest
+
+from scheduler.arrivals import Arrivals, CsvArrivals, convert_csv
+from scheduler.input_parser import InputGenerator, InputParser
+
+CHANGE_TIMES = [[0, 2, 3], [2, 0, 1], [3, 1, 0]]
+WORK_TIMES = [1, 2, 3]
+
+
+def write_input(tmp_path, arrivals_name: str, num_samples: int, seed: int = 0) -> list[str]:
+    filenames = [str(tmp_path / arrivals_name), str(tmp_path / "change_times.csv"), str(tmp_path / "work_times.csv")]
+    gen = InputGenerator(CHANGE_TIMES, WORK_TIMES)
+    gen.generate_data(0.4, [0.5, 0.3, 0.2], num_samples, seed)
+    gen.write(*filenames)
+    return filenames
+
+
+@pytest.mark.parametrize("num_samples", [0, 1, 2500])
+def test_csv_and_binary_round_trip(tmp_path, monkeypatch, num_samples):
+    # Several chunks
+    monkeypatch.setattr(InputGenerator, "CHUNK", 1000)
+    monkeypatch.setattr(Arrivals, "CHUNK", 700)
+    csv_files = write_input(tmp_path, "arrivals.csv", num_samples)
+    bin_files = write_input(tmp_path, "arrivals.bin", num_samples)
+    expected = list(CsvArrivals(csv_files[0]))
+    assert len(expected) == num_samples
+
+    # The generator writes the same arrivals in both formats, the csv one is converted to binary
+    converted = str(tmp_path / "converted.bin")
+    convert_csv(csv_files[0], converted)
+    for filename in (bin_files[0], converted):
+        arrivals = Arrivals.open(filename)
+        assert len(arrivals) == num_samples
+        assert list(arrivals) == expected
+        if num_samples != 0:
+            # Read-only views of the mapped file, not copies
+            for column in (arrivals.timestamps, arrivals.queues):
+                assert not column.flags.owndata and not column.flags.writeable
+            assert arrivals[num_samples - 1] == list(expected[-1])
+            assert list(arrivals.iter_from(num_samples // 2)) == expected[num_samples // 2:]
+
+    # Parsed csv, streamed csv and mapped binary inputs are the same
+    parsers = [InputParser(*csv_files, logs_on=False), InputParser(*csv_files, logs_on=False, load_arrivals=False),
+               InputParser(*bin_files, logs_on=False)]
+    for ip in parsers:
+        assert list(ip.arrivals) == expected
+        assert ip.change_times == CHANGE_TIMES
+        assert ip.work_times == WORK_TIMES
+
+
+def test_not_arrivals_file_is_rejected(tmp_path):
+    filename = str(tmp_path / "arrivals.bin")
+    with open(filename, 'wb') as file:
+        file.write(b"0,1\n" * 20)
+    with pytest.raises(AssertionError):
+        Arrivals.open(filename)
@@ -0,0 +1,65 @@
+import os
+
+from scheduler.cache import InputCache
+from scheduler.input_parser import InputParser
+
+
+def write_input(path, arrivals: list) -> list[str]:
+    path.mkdir(exist_ok=True)
+    filenames = [str(path / name) for name in ("arrivals.csv", "change_times.csv", "work_times.csv")]
+    with open(filenames[0], 'w') as file:
+        file.writelines("{}, {}\n".format(timestamp, queue) for timestamp, queue in arrivals)
+    with open(filenames[1], 'w') as file:
+        file.write("0, 2\n3, 0\n")
+    with open(filenames[2], 'w') as file:
+        file.write("1, 2\n")
+    return filenames
+
+
+def parse(filenames: list, cache: InputCache) -> InputParser:
+    return InputParser(*filenames, False, cache=cache)
+
+
+def test_hit_returns_parsed_input(tmp_path):
+    filenames = write_input(tmp_path, [(0, 0), (1, 1), (1, 0), (5, 1)])
+    cache = InputCache(str(tmp_path / "cache"))
+    parsed = parse(filenames, cache)
+    assert parsed.from_cache is False
+    cached = parse(filenames, cache)
+    assert cached.from_cache is True
+    assert list(cached.arrivals) == list(parsed.arrivals) == [(0, 0), (1, 1), (1, 0), (5, 1)]
+    assert (cached.change_times, cached.work_times) == (parsed.change_times, parsed.work_times)
+    # Temporary files of the writer are removed
+    assert all(not name.endswith(".tmp") for name in os.listdir(cache.dir_))
+
+
+def test_changed_file_is_parsed_again(tmp_path):
+    filenames = write_input(tmp_path, [(0, 0), (1, 1)])
+    cache = InputCache(str(tmp_path / "cache"))
+    parse(filenames, cache)
+    write_input(tmp_path, [(0, 0), (1, 1), (2, 1)])
+    parsed = parse(filenames, cache)
+    assert parsed.from_cache is False
+    assert list(parsed.arrivals) == [(0, 0), (1, 1), (2, 1)]
+    assert parse(filenames, cache).from_cache is True
+
+
+def test_broken_entry_is_parsed_again(tmp_path):
+    filenames = write_input(tmp_path, [(0, 0), (1, 1)])
+    cache = InputCache(str(tmp_path / "cache"))
+    parse(filenames, cache)
+    with open(cache.entry_(InputCache.key(*filenames))[1], 'w') as file:
+        file.write("{")
+    parsed = parse(filenames, cache)
+    assert parsed.from_cache is False
+    assert list(parsed.arrivals) == [(0, 0), (1, 1)]
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = InputCache(str(tmp_path / "cache"), max_bytes=1)
+    first = write_input(tmp_path / "first", [(0, 0)])
+    second = write_input(tmp_path / "second", [(0, 1)])
+    parse(first, cache)
+    parse(second, cache)
+    assert parse(second, cache).from_cache is True
+    assert parse(first, cache).from_cache is False
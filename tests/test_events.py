@@ -0,0 +1,71 @@
+import random
+
+from scheduler.benchmarks import SyntheticInput
+from scheduler.events import Event, Events
+from scheduler.methods import MRandom, MSmart
+from scheduler.solver import Solver
+
+
+class ListEvents(Events):
+    """
+    The list-based calendar, which Events replaced
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.list_ = []
+
+    def add(self, event: Event):
+        for i, ev in enumerate(self.list_):
+            if event < ev:
+                self.list_.insert(i, event)
+                return
+        self.list_.append(event)
+
+    def size(self) -> int:
+        return len(self.list_)
+
+    def next_timestamp(self) -> int:
+        return self.list_[0].timestamp
+
+    def get(self) -> Event:
+        return self.list_.pop(0)
+
+    def arrives(self, arrives, coalesce=False):
+        self.list_ += [Event(timestamp, Event.ARRIVE, number) for timestamp, number in arrives]
+
+
+def processed_events(ip, method, events: Events = None) -> tuple[list, dict]:
+    random.seed(0)
+    solver = Solver(ip, method(ip), keep_distrib=False)
+    if events is not None:
+        solver.events_ = events
+        events.arrives(ip.arrivals)
+    processed = []
+    solve = solver.solve_
+
+    def record(event: Event):
+        processed.append((event.timestamp, event.type, event.qnumber))
+        solve(event)
+
+    solver.solve_ = record
+    solver.simulate()
+    return processed, solver.results()
+
+
+def test_heap_calendar_keeps_list_order():
+    for seed in range(3):
+        ip = SyntheticInput(2000, 4, seed)
+        for method in (MSmart, MRandom):
+            assert processed_events(ip, method) == processed_events(ip, method, ListEvents())
+
+
+def test_equal_events_are_fifo():
+    events = Events()
+    for qnumber in range(5):
+        events.load(10, qnumber)
+    events.unload(10, 7)
+    events.arrive(10, 8)
+    order = [(ev.type, ev.qnumber) for ev in (events.get() for _ in range(7))]
+    assert order == [(Event.UNLOAD, 7), (Event.ARRIVE, 8)] + [(Event.LOAD, qnumber) for qnumber in range(5)]
+
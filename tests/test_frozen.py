@@ -0,0 +1,94 @@
+import itertools
+import math
+import random
+
+import numpy as np
+import pytest
+
+from scheduler.benchmarks import SyntheticInput
+from scheduler.methods import FrozenPolicy, MBrainLike, Memory, MFrozen, Remember, State
+from scheduler.solver import Solver
+
+LEVELS = 6
+# Number of the thresholds of Memory.get_action per cell
+GRID = 1000
+
+
+@pytest.fixture(scope="module")
+def trained():
+    ip = SyntheticInput(3000, 3, 0)
+    random.seed(0)
+    met = MBrainLike(ip)
+    Solver(ip, met, keep_distrib=False).simulate()
+    return met, FrozenPolicy.compile(met.memory_, LEVELS)
+
+
+def cells(queues_num: int, levels: int):
+    for counts in itertools.product(range(levels + 1), repeat=queues_num):
+        if sum(counts) == levels:
+            for last_queue in range(queues_num):
+                yield last_queue, list(counts)
+
+
+def test_compiled_cells_equal_get_action(trained, monkeypatch):
+    met, policy = trained
+    lambda_expovariate = met.config_.lambda_expovariate
+    # Quantiles of the exponential threshold, each has probability 1 / GRID
+    thresholds = [-math.log(1 - (i + 0.5) / GRID) / lambda_expovariate for i in range(GRID)]
+    assert len(policy) != 0
+
+    for last_queue, queues in cells(3, LEVELS):
+        cell = policy.cell(queues, last_queue, LEVELS)
+        state = State(queues, last_queue)
+        if met.memory_.find_alike(state) == 0:
+            assert cell not in policy.cells_
+            continue
+
+        greedy, actions, cumulative = policy.cells_[cell]
+        probs = dict(zip(actions, np.diff([0.0] + cumulative)))
+        assert cumulative[-1] == pytest.approx(1.0)
+        assert probs[greedy] == max(probs.values())
+
+        thresholds_iter = iter(thresholds)
+        monkeypatch.setattr(random, "expovariate", lambda _: next(thresholds_iter))
+        freqs = dict.fromkeys(range(3), 0.0)
+        for _ in range(GRID):
+            freqs[met.load(queues, last_queue)] += 1 / GRID
+        monkeypatch.undo()
+
+        # A boundary between the Remembers shifts at most one threshold of the grid
+        tolerance = met.memory_.find_alike(state) / GRID + 1e-9
+        for action, freq in freqs.items():
+            assert freq == pytest.approx(probs.get(action, 0.0), abs=tolerance)
+
+
+def test_unknown_cell_is_random_nonempty():
+    ip = SyntheticInput(10, 3, 0)
+    random.seed(0)
+    for sample in (True, False):
+        met = MFrozen(ip, FrozenPolicy(3, LEVELS, {}), sample)
+        actions = {met.load([0, 2, 5], 0) for _ in range(100)}
+        assert actions == {1, 2}
+
+
+def test_empty_action_is_random_nonempty():
+    ip = SyntheticInput(10, 3, 0)
+    queues = [0, 4, 2]
+    cell = FrozenPolicy(3, LEVELS, {}).cell(queues, 1, sum(queues))
+    random.seed(0)
+    for sample in (True, False):
+        met = MFrozen(ip, FrozenPolicy(3, LEVELS, {cell: (0, [0], [1.0])}), sample)
+        actions = {met.load(queues, 1) for _ in range(100)}
+        assert actions == {1, 2}
+
+
+def test_greedy_is_most_probable_action():
+    memory = Memory(3)
+    # Any threshold of get_action is above both losses, so the last one is always
+    # taken, though the first one has the best result
+    for timestamp, (action, result) in enumerate([(0, 2.0), (1, 1.0)]):
+        memory.add_remember(Remember.restore(timestamp, State([2, 2, 2], 0), State([2, 2, 2], action), action, result))
+    policy = FrozenPolicy.compile(memory, LEVELS)
+    cell = policy.cell([2, 2, 2], 0, 6)
+    assert policy.cells_[cell] == (1, [1], [1.0])
+    assert memory.get_action(State([2, 2, 2], 0)).action == 1
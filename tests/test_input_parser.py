@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pytest
+
+from scheduler.input_parser import InputGenerator
+from scheduler.processes import BurstyProcess, DiurnalProcess, PoissonProcess, make_processes
+
+DESCRIPTIONS = [
+    {"type": "poisson", "rate": 0.2},
+    {"type": "bursty", "rates": [0.05, 1.0], "switch_rates": [0.01, 0.1]},
+    {"type": "diurnal", "rate": 0.3, "amplitude": 0.8, "period": 500}
+]
+
+
+def generate(descriptions, num_samples: int, seed) -> tuple:
+    gen = InputGenerator([[0] * len(descriptions)] * len(descriptions), [1] * len(descriptions))
+    gen.generate_processes(make_processes(descriptions), num_samples, seed)
+    arrivals = gen.arrivals()
+    return arrivals.timestamps, arrivals.queues
+
+
+def test_make_processes_from_file(tmp_path):
+    filename = str(tmp_path / "processes.json")
+    with open(filename, 'w') as file:
+        json.dump(DESCRIPTIONS, file)
+    processes = make_processes(filename)
+    assert [type(proc) for proc in processes] == [PoissonProcess, BurstyProcess, DiurnalProcess]
+    assert processes[0].mean_rate() == 0.2
+
+
+@pytest.mark.parametrize("num_samples", [0, 1, 2500, 7000])
+def test_generate_processes_exact_and_reproducible(monkeypatch, num_samples):
+    # Several chunks
+    monkeypatch.setattr(InputGenerator, "CHUNK", 1000)
+    timestamps, queues = generate(DESCRIPTIONS, num_samples, 1)
+    assert len(timestamps) == len(queues) == num_samples
+    assert np.all(np.diff(timestamps) >= 0)
+    assert set(queues.tolist()) <= {0, 1, 2}
+
+    same = generate(DESCRIPTIONS, num_samples, 1)
+    assert np.array_equal(same[0], timestamps) and np.array_equal(same[1], queues)
+    if num_samples > 1:
+        other = generate(DESCRIPTIONS, num_samples, 2)
+        assert not np.array_equal(other[0], timestamps)
+
+
+def test_generate_data_exact_and_reproducible(monkeypatch):
+    monkeypatch.setattr(InputGenerator, "CHUNK", 1000)
+    results = []
+    for _ in range(2):
+        gen = InputGenerator([[0, 1], [1, 0]], [1, 1])
+        gen.generate_data(0.5, [0.3, 0.7], 2500, 3)
+        results.append(gen.arrivals())
+    assert len(results[0]) == 2500
+    assert np.array_equal(results[0].timestamps, results[1].timestamps)
+    assert np.array_equal(results[0].queues, results[1].queues)
+
+
+def test_zero_rates_are_rejected():
+    descriptions = [{"type": "bursty", "rates": [0, 0], "switch_rates": [0.1, 0.1]}] * 2
+    with pytest.raises(ValueError):
+        generate(descriptions, 10, 1)
+    assert len(generate(descriptions, 0, 1)[0]) == 0
@@ -0,0 +1,167 @@
+import pickle
+import random
+
+import pytest
+
+from scheduler.methods import BrainConfig, LookaheadConfig, Memory, Remember, State, TabularConfig
+
+CONFIGS = [BrainConfig(), BrainConfig(alpha=0.5, beta=1.0, equal_threshold=0.05, similar_threshold=0.3)]
+
+
+def random_memory(config: BrainConfig, queues_num: int = 4, size: int = 300, seed: int = 0) -> Memory:
+    rng = random.Random(seed)
+    memory = Memory(queues_num, config=config)
+    for timestamp in range(size):
+        queues = [rng.randint(0, 6) for _ in range(queues_num)]
+        action = rng.randrange(queues_num)
+        queues[action] += 1
+        state_before = State(queues, rng.randrange(2))
+        queues[action] -= 1
+        rem = Remember(timestamp, state_before, State(queues, action), action)
+        rem.result_ = rng.random()
+        memory.add_remember(rem)
+    return memory
+
+
+def random_states(queues_num: int = 4, count: int = 50, seed: int = 1) -> list[State]:
+    rng = random.Random(seed)
+    return [State([rng.randint(0, 6) for _ in range(queues_num - 1)] + [1], rng.randrange(2)) for _ in range(count)]
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_distances_equal_state_distance(config):
+    memory = random_memory(config)
+    slots = memory.alive_slots_()
+    for state in random_states():
+        expected = [
+            State.distance(state, memory.memory_[slot].state_before, config.alpha, config.beta) for slot in slots
+        ]
+        assert memory.distances(state, slots).tolist() == expected
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_lookups_equal_linear_scan(config):
+    memory = random_memory(config)
+    for state in random_states():
+        near = []
+        # Remembers with equal distances keep the insertion order
+        for rem in sorted(memory, key=lambda rem: memory.numbers_[rem.slot_]):
+            dist = State.distance(rem.state_before, state, config.alpha, config.beta)
+            # Cannot execute action
+            if dist == -1 or state.elems_proportion[rem.action] == 0:
+                continue
+            near.append((dist, rem))
+        near.sort(key=lambda elem: elem[0])
+
+        assert memory.get_sorted_memory(state) == [rem for _, rem in near]
+        assert memory.find_alike(state) == sum(1 for dist, _ in near if dist <= config.similar_threshold)
+
+
+def random_remember(rng: random.Random, timestamp: int, queues_num: int = 4) -> Remember:
+    queues = [rng.randint(0, 6) for _ in range(queues_num)]
+    action = rng.randrange(queues_num)
+    queues[action] += 1
+    rem = Remember(timestamp, State(queues, rng.randrange(2)), State(queues, action), action)
+    # Distinct results, so the worst one is unique
+    rem.result_ = rng.random()
+    return rem
+
+
+@pytest.mark.parametrize("eviction", [Memory.EVICT_LRU, Memory.EVICT_VALUE])
+def test_eviction_order(eviction):
+    rng = random.Random(0)
+    config = BrainConfig(remember_lifetime=30)
+    memory = Memory(4, capacity=20, eviction=eviction, config=config)
+    # Remembers from the least to the most recently added or updated
+    expected = []
+    for timestamp in range(600):
+        if len(expected) != 0 and rng.random() < 0.5:
+            old_rem = rng.choice(expected)
+            new_rem = random_remember(rng, timestamp)
+            memory.update_res(old_rem, new_rem)
+            expected.remove(old_rem)
+            expected.append(old_rem)
+            assert memory.results_[old_rem.slot_] == old_rem.result
+        else:
+            victim = None
+            if len(expected) == 20:
+                if eviction == Memory.EVICT_LRU:
+                    victim = expected[0]
+                else:
+                    victim = min(expected, key=lambda rem: rem.result)
+                expected.remove(victim)
+            rem = random_remember(rng, timestamp)
+            memory.append_(rem)
+            expected.append(rem)
+            assert victim is None or victim.slot_ is None
+
+        # Not updated for longer than remember_lifetime, from the oldest one
+        memory.renew(timestamp)
+        expected = [rem for rem in expected if timestamp - rem.timestamp <= config.remember_lifetime]
+        assert list(memory) == expected
+        assert sorted(memory.alive_slots_().tolist()) == sorted(rem.slot_ for rem in expected)
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+def test_snapshot_round_trip(tmp_path, config):
+    memory = random_memory(config)
+    # Updates change the order of Remembers
+    for rem in list(memory)[::3]:
+        memory.update_res(rem, Remember.restore(400, rem.state_before, rem.state_after, rem.action, 0.5))
+    filename = str(tmp_path / "memory.npz")
+    memory.save(filename)
+
+    loaded = Memory.load(filename, config=config)
+    assert loaded.queues_num == memory.queues_num
+    assert loaded.last_timestamp() == memory.last_timestamp() == 400
+    assert list(loaded) == list(memory)
+    for state in random_states():
+        assert loaded.get_sorted_memory(state) == memory.get_sorted_memory(state)
+    # The least recently updated Remembers are evicted
+    assert list(Memory.load(filename, capacity=50, config=config)) == list(memory)[-50:]
+
+    # The empty Memory
+    Memory(3, config=config).save(filename)
+    loaded = Memory.load(filename, config=config)
+    assert (loaded.queues_num, len(loaded), loaded.last_timestamp()) == (3, 0, -1)
+
+
+@pytest.mark.parametrize("config", CONFIGS + [
+    TabularConfig(levels=7, epsilon=0.2), LookaheadConfig(horizon=2, budget=30)
+])
+def test_config_round_trip(tmp_path, config):
+    filename = str(tmp_path / "config.json")
+    config.save(filename)
+    loaded = type(config).load(filename)
+    assert loaded.to_dict() == config.to_dict()
+    assert repr(loaded) == repr(config)
+
+
+def test_state_round_trip():
+    states = random_states(count=200) + [State([0, 0, 0, 0], 1)]
+    table = {state: i for i, state in enumerate(states)}
+    for state in states:
+        copies = [
+            State.from_proportions(state.elems_proportion, state.num_elements, state.last_queue),
+            pickle.loads(pickle.dumps(state)),
+        ]
+        for copy in copies:
+            assert copy == state and hash(copy) == hash(state)
+            assert copy.elems_proportion == state.elems_proportion
+            assert State.distance(copy, states[0]) == State.distance(state, states[0])
+            # Equal states are one dict key
+            assert table[copy] == table[state]
+
+
+def test_quantised_buckets():
+    rng = random.Random(2)
+    for _ in range(200):
+        queues = [rng.randint(0, 9) for _ in range(4)]
+        queues[rng.randrange(4)] += 1
+        for levels in (1, 5, State.LEVELS):
+            bucket = State.quantise(queues, sum(queues), levels)
+            assert sum(bucket) == levels
+            # Bucket of the proportions, not of the lengths
+            assert State.quantise([3 * elem for elem in queues], 3 * sum(queues), levels) == bucket
+            state = State(queues, 0)
+            assert all(abs(count / levels - prop) < 1 / levels for count, prop in zip(bucket, state.elems_proportion))
@@ -0,0 +1,95 @@
+import itertools
+import random
+
+import pytest
+
+from scheduler.benchmarks import SyntheticInput
+from scheduler.methods import METHODS, LookaheadConfig, MLookahead, MSmart, State
+from scheduler.queue_state import QueueState
+from scheduler.solver import Solver
+
+
+class RandomInput:
+    def __init__(self, num_queues: int, seed: int = 0):
+        rng = random.Random(seed)
+        self.change_times = [[0 if i == j else rng.randint(1, 20) for j in range(num_queues)]
+                             for i in range(num_queues)]
+        self.work_times = [rng.randint(1, 10) for _ in range(num_queues)]
+
+
+def best_order_cost(ip, queues: list, last_queue: int) -> int:
+    """
+    Sum of completion times of the best order of the batches of all non-empty queues
+    """
+    best = None
+    for order in itertools.permutations([qnumber for qnumber, count in enumerate(queues) if count != 0]):
+        now, cost, prev = 0, 0, last_queue
+        for qnumber in order:
+            now += ip.change_times[prev][qnumber]
+            for _ in range(queues[qnumber]):
+                now += ip.work_times[qnumber]
+                cost += now
+            prev = qnumber
+        best = cost if best is None else min(best, cost)
+    return best
+
+
+def order_cost_from(ip, queues: list, last_queue: int, first: int) -> int:
+    rest = list(queues)
+    rest[first] = 0
+    change, work, count = ip.change_times[last_queue][first], ip.work_times[first], queues[first]
+    return count * change + work * count * (count + 1) // 2 + \
+        sum(rest) * (change + count * work) + best_order_cost(ip, rest, first)
+
+
+def test_lookahead_finds_best_order():
+    rng = random.Random(0)
+    for seed in range(30):
+        num_queues = rng.randint(2, 6)
+        ip = RandomInput(num_queues, seed)
+        met = MLookahead(ip, LookaheadConfig(horizon=num_queues, budget=10 ** 9))
+        queues = [rng.randint(0, 4) for _ in range(num_queues)]
+        last_queue = rng.randrange(num_queues)
+        queues[last_queue] = 0
+        if sum(queues) == 0:
+            continue
+        action = met.select_(QueueState(queues), last_queue)
+        assert order_cost_from(ip, queues, last_queue, action) == best_order_cost(ip, queues, last_queue)
+
+
+def test_lookahead_without_budget_is_greedy():
+    ip = RandomInput(20)
+    greedy = MSmart(ip)
+    rng = random.Random(1)
+    for budget in (0, 5):
+        met = MLookahead(ip, LookaheadConfig(budget=budget))
+        for _ in range(20):
+            queues = [rng.randint(1, 3) for _ in range(20)]
+            queues[0] = 0
+            assert met.load(QueueState(queues), 0) == greedy.load(queues, 0)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_tabular_beats_random(seed):
+    ip = SyntheticInput(5000, 3, 0)
+    totals = {}
+    for algo_name in ("MRandom", "MTabular"):
+        random.seed(seed)
+        solver = Solver(ip, METHODS[algo_name](ip), keep_distrib=False)
+        solver.simulate()
+        totals[algo_name] = sum(solver.results()["mean_queues"])
+    assert totals["MTabular"] < 0.7 * totals["MRandom"]
+
+
+def test_quantise_of_nonempty_queues():
+    rng = random.Random(0)
+    for _ in range(200):
+        queues = QueueState([rng.choice([0, rng.randint(1, 50)]) for _ in range(rng.randint(1, 8))])
+        if queues.total() == 0:
+            continue
+        for levels in (1, 7, 20):
+            counts = State.quantise(queues, queues.total(), levels, queues.nonempty())
+            assert counts == State.quantise(list(queues), queues.total(), levels)
+            assert sum(counts) == levels
+            assert all(abs(count / levels - elems / queues.total()) < 1 / levels
+                       for count, elems in zip(counts, queues))
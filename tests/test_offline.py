@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from scheduler.benchmarks import SyntheticInput
+from scheduler.methods import METHODS
+from scheduler.offline import srpt_lower_bound, waiting_area
+from scheduler.solver import Solver
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_bound_is_below_every_method(seed):
+    ip = SyntheticInput(1000, 4, seed)
+    bound = srpt_lower_bound(ip.arrivals, ip.work_times, ip.change_times)
+    for algo_name in METHODS:
+        random.seed(0)
+        solver = Solver(ip, METHODS[algo_name](ip), keep_distrib=False)
+        solver.simulate()
+        assert bound <= waiting_area(solver.results())
+
+
+def test_bound_charges_change_times():
+    ip = SyntheticInput(1000, 4, 0)
+    no_changes = [[0] * len(ip.work_times) for _ in ip.work_times]
+    assert srpt_lower_bound(ip.arrivals, ip.work_times, ip.change_times) > \
+        srpt_lower_bound(ip.arrivals, ip.work_times, no_changes)
+
+
+def test_bound_rejects_several_servers():
+    ip = SyntheticInput(100, 4, 0)
+    with pytest.raises(ValueError):
+        srpt_lower_bound(ip.arrivals, ip.work_times, ip.change_times, servers=2)
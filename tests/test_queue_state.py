@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from scheduler.queue_state import QueueState, preference_orders
+
+
+def check_state(queues: QueueState, counts: list, costs: list[list], orders: list[list[int]]):
+    nonempty = [qnumber for qnumber, count in enumerate(counts) if count != 0]
+    assert list(queues) == counts
+    assert queues.total() == sum(counts)
+    assert sorted(queues.nonempty()) == nonempty
+    assert queues.num_nonempty() == len(nonempty)
+    assert queues.is_empty() == (len(nonempty) == 0)
+    if len(nonempty) == 0:
+        return
+
+    assert queues.any_nonempty() in nonempty
+    for last_queue, row in enumerate(costs):
+        assert queues.first_nonempty(orders[last_queue], row) == min(nonempty, key=lambda q: (row[q], q))
+    drawn = {queues.random_nonempty() for _ in range(20 * len(nonempty))}
+    assert drawn == set(nonempty)
+
+
+@pytest.mark.parametrize("num_queues", [1, 3, 12])
+def test_random_pushes_and_pops(num_queues):
+    rng = random.Random(num_queues)
+    random.seed(0)
+    # Few cost levels, so orders have ties
+    costs = [[rng.randint(0, 3) for _ in range(num_queues)] for _ in range(num_queues)]
+    orders = preference_orders(costs)
+    counts = [rng.randint(0, 2) for _ in range(num_queues)]
+    queues = QueueState(counts)
+    check_state(queues, counts, costs, orders)
+
+    for step in range(600):
+        # Phases of growth and drain, so queues are emptied and refilled
+        pop_prob = 0.3 if step // 100 % 2 == 0 else 0.8
+        if rng.random() < pop_prob and sum(counts) != 0:
+            qnumber = rng.choice([q for q, count in enumerate(counts) if count != 0])
+            queues.take(qnumber)
+            counts[qnumber] -= 1
+        else:
+            qnumber = rng.randrange(num_queues)
+            count = rng.choice([1, 1, 3])
+            queues.add(qnumber, count)
+            counts[qnumber] += count
+        check_state(queues, counts, costs, orders)
+
+
+def test_empty_and_refill():
+    costs = [[0, 1, 2], [1, 0, 1], [2, 1, 0]]
+    orders = preference_orders(costs)
+    queues = QueueState.zeros(3)
+    check_state(queues, [0, 0, 0], costs, orders)
+
+    queues.add(0)
+    queues.add(2, 2)
+    check_state(queues, [1, 0, 2], costs, orders)
+    queues.take(0)
+    check_state(queues, [0, 0, 2], costs, orders)
+    queues.take(2)
+    queues.take(2)
+    check_state(queues, [0, 0, 0], costs, orders)
+
+    queues.add(2)
+    queues.add(0)
+    queues.add(1)
+    check_state(queues, [1, 1, 1], costs, orders)
+    queues.take(1)
+    check_state(queues, [1, 0, 1], costs, orders)
+    queues.add(1)
+    check_state(queues, [1, 1, 1], costs, orders)
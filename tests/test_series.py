@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+
+from scheduler.benchmarks import SyntheticInput
+from scheduler.events import Event
+from scheduler.methods import MSmart
+from scheduler.series import QueuesSeries
+from scheduler.solver import Solver
+
+
+def queues_distrib(events: list, num_queues: int) -> list:
+    """
+    The former Events.queues_distrib: queue lengths before the events of each timestamp
+    """
+    cur_queues = [0] * num_queues
+    hist_queues = [[0] * num_queues]
+    last_timestamp = 0
+    for timestamp, etype, qnumber in events:
+        for _ in range(last_timestamp, timestamp):
+            hist_queues.append(cur_queues.copy())
+        last_timestamp = timestamp
+        if etype == Event.ARRIVE:
+            cur_queues[qnumber] += 1
+        if etype in (Event.LOAD, Event.LOAD_CH):
+            cur_queues[qnumber] -= 1
+    return hist_queues
+
+
+def run(ip) -> tuple[QueuesSeries, list]:
+    random.seed(0)
+    solver = Solver(ip, MSmart(ip))
+    processed = []
+    solve = solver.solve_
+
+    def record(event: Event):
+        processed.append((event.timestamp, event.type, event.qnumber))
+        solve(event)
+
+    solver.solve_ = record
+    return solver.run(), processed
+
+
+def test_resample_equals_queues_distrib():
+    ip = SyntheticInput(2000, 4, 0)
+    series, events = run(ip)
+    times, counts = series.resample()
+    assert times.tolist() == list(range(series.end + 1))
+    assert counts.tolist() == queues_distrib(events, 4)
+
+    times, counts = series.resample(step=7, start=3, end=500)
+    assert times.tolist() == list(range(3, 501, 7))
+    assert counts.tolist() == [queues_distrib(events, 4)[time] for time in times]
+
+
+def test_save_load_round_trip(tmp_path):
+    ip = SyntheticInput(2000, 4, 0)
+    series, _ = run(ip)
+    filename = str(tmp_path / "series.npz")
+    series.save(filename)
+    loaded = QueuesSeries.load(filename)
+    assert (loaded.num_queues, loaded.end, len(loaded)) == (series.num_queues, series.end, len(series))
+    for expected, actual in zip(series.resample(), loaded.resample()):
+        assert np.array_equal(expected, actual)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+from scheduler.benchmarks import SyntheticInput
+from scheduler.methods import METHODS
+from scheduler.service import DispatchService, replay
+from scheduler.solver import Solver
+
+
+async def serve_and_replay(ip, met, servers: int, path: str, num_queues: int = None, **params) -> dict:
+    if num_queues is None:
+        num_queues = len(ip.work_times)
+    service = asyncio.create_task(DispatchService(met, num_queues, servers).serve(unix=path))
+    try:
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        return await replay(ip.arrivals, ip.change_times, ip.work_times, unix=path, timeout=10, **params)
+    finally:
+        service.cancel()
+
+
+@pytest.mark.parametrize("algo_name", ["MRandom", "MSmart", "MBrainLike"])
+@pytest.mark.parametrize("servers", [1, 2])
+def test_lockstep_replay_equals_solver(tmp_path, algo_name, servers):
+    ip = SyntheticInput(500, 4, 0)
+    random.seed(0)
+    solver = Solver(ip, METHODS[algo_name](ip), keep_distrib=False, servers=servers)
+    solver.simulate()
+
+    random.seed(0)
+    res = asyncio.run(serve_and_replay(ip, METHODS[algo_name](ip), servers, str(tmp_path / "s.sock"),
+                                       lockstep=True))
+    assert res["decisions"] == len(ip.arrivals)
+    assert res["results"] == solver.results()
+
+
+def test_replay_dispatches_all(tmp_path):
+    ip = SyntheticInput(500, 4, 0)
+    res = asyncio.run(serve_and_replay(ip, METHODS["MSmart"](ip), 2, str(tmp_path / "s.sock")))
+    assert res["decisions"] == len(ip.arrivals)
+    assert res["waiting"] == 0 and res["busy"] == 0
+
+
+@pytest.mark.parametrize("lockstep", [False, True])
+def test_replay_fails_on_rejected_arrival(tmp_path, lockstep):
+    ip = SyntheticInput(500, 4, 0)
+    # The last queue is unknown to the service
+    with pytest.raises(RuntimeError, match="Unknown queue"):
+        asyncio.run(serve_and_replay(ip, METHODS["MSmart"](ip), 1, str(tmp_path / "s.sock"), num_queues=3,
+                                     lockstep=lockstep))
+
+
+@pytest.mark.parametrize("lockstep", [False, True])
+def test_replay_fails_on_closed_connection(tmp_path, lockstep):
+    ip = SyntheticInput(500, 4, 0)
+    path = str(tmp_path / "s.sock")
+
+    async def close(reader, writer):
+        await reader.readline()
+        writer.close()
+
+    async def main():
+        async with await asyncio.start_unix_server(close, path):
+            await replay(ip.arrivals, ip.change_times, ip.work_times, unix=path, timeout=10, lockstep=lockstep)
+
+    # Unsent notifications may be rejected by the socket
+    with pytest.raises((RuntimeError, ConnectionError)):
+        asyncio.run(main())
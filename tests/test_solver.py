@@ -0,0 +1,157 @@
+import random
+
+import pytest
+
+from scheduler.arrivals import Arrivals
+from scheduler.benchmarks import SyntheticInput
+from scheduler.methods import METHODS
+from scheduler.solver import Solver
+from scheduler.statistics import Accumulator, default_accumulators
+
+
+def crowded_input(num_arrivals: int = 2000, num_queues: int = 4, seed: int = 0) -> SyntheticInput:
+    """
+    SyntheticInput, where arrivals are moved to multiples of 4 timestamps,
+    so many of them share a timestamp and the load is the same
+    """
+    ip = SyntheticInput(num_arrivals, num_queues, seed)
+    ip.arrivals_ = Arrivals(ip.arrivals.timestamps // 4 * 4, ip.arrivals.queues)
+    return ip
+
+
+def run(ip, algo_name: str, servers: int = 1, **params) -> tuple[dict, list]:
+    """
+    Returns the results and the decisions of the method
+    """
+    random.seed(0)
+    met = METHODS[algo_name](ip)
+    decisions = []
+    load = met.load
+
+    def recorded(queues, last_queue, server=0):
+        queue = load(queues, last_queue, server)
+        decisions.append((tuple(queues), last_queue, server, queue))
+        return queue
+
+    met.load = recorded
+    solver = Solver(ip, met, keep_distrib=False, servers=servers, **params)
+    solver.simulate()
+    return solver.results(), decisions
+
+
+@pytest.mark.parametrize("algo_name", ["MRandom", "MSmart", "MBrainLike"])
+@pytest.mark.parametrize("servers", [1, 3])
+def test_coalesce_keeps_statistics_and_decisions(algo_name, servers):
+    ip = crowded_input()
+    assert run(ip, algo_name, servers, coalesce=True) == run(ip, algo_name, servers)
+
+
+def method_state(met) -> str:
+    if hasattr(met, "memory_"):
+        return str(met.memory_)
+    if hasattr(met, "table_"):
+        return repr(sorted((key, entry.values) for key, entry in met.table_.items()))
+    return ""
+
+
+@pytest.mark.parametrize("algo_name", ["MRandom", "MSmart", "MBrainLike", "MTabular", "MLookahead"])
+@pytest.mark.parametrize("servers", [1, 2])
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_resumed_run_is_identical(tmp_path, algo_name, servers, coalesce):
+    ip = crowded_input()
+    params = dict(keep_distrib=False, servers=servers, coalesce=coalesce)
+
+    random.seed(0)
+    solver = Solver(ip, METHODS[algo_name](ip), **params)
+    solver.simulate()
+    expected = solver.results(), method_state(solver.method)
+
+    # Periodic checkpoints of the interrupted run
+    filename = str(tmp_path / "checkpoint.bin")
+    random.seed(0)
+    solver = Solver(ip, METHODS[algo_name](ip), checkpoint_every=500, checkpoint_file=filename, **params)
+    solver.simulate(ip.arrivals[len(ip.arrivals) // 2][0])
+
+    # The other random state must be replaced by the checkpoint
+    random.seed(1)
+    resumed = Solver(ip, METHODS[algo_name](ip), resume=filename, **params)
+    resumed.simulate()
+    assert (resumed.results(), method_state(resumed.method)) == expected
+
+
+class Trace(Accumulator):
+    """
+    Loads and unloads of each server
+    """
+    name = "trace"
+
+    def start(self, num_queues, num_servers=1):
+        self.events = [[] for _ in range(num_servers)]
+
+    def load(self, timestamp, qnumber, changed, queues, server=0):
+        self.events[server].append(("load", timestamp, qnumber))
+
+    def unload(self, timestamp, qnumber, queues, server=0):
+        self.events[server].append(("unload", timestamp, qnumber))
+
+    def result(self, timestamp, queues):
+        return self.events
+
+
+@pytest.mark.parametrize("algo_name", ["MRandom", "MSmart", "MBrainLike", "MTabular", "MLookahead"])
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_two_servers_serve_each_task_once(algo_name, coalesce):
+    ip = crowded_input()
+    random.seed(0)
+    solver = Solver(ip, METHODS[algo_name](ip), default_accumulators(2) + [Trace()], keep_distrib=False,
+                    servers=2, coalesce=coalesce)
+    solver.simulate()
+    events = solver.results()["trace"]
+
+    arrivals = {}
+    for timestamp, qnumber in ip.arrivals:
+        arrivals.setdefault(qnumber, []).append(timestamp)
+    loads = {}
+    busy = [0, 0]
+    changes = 0
+    for server, server_events in enumerate(events):
+        assert len(server_events) != 0
+        last_queue, free_since = 0, 0
+        # A server alternates loads and unloads of the same task
+        for (load, start, qnumber), (unload, end, done) in zip(server_events[::2], server_events[1::2]):
+            assert (load, unload, done) == ("load", "unload", qnumber)
+            assert start >= free_since
+            assert end - start == ip.change_times[last_queue][qnumber] + ip.work_times[qnumber]
+            loads.setdefault(qnumber, []).append(start)
+            busy[server] += end - start
+            changes += ip.change_times[last_queue][qnumber]
+            last_queue, free_since = qnumber, end
+        assert len(server_events) % 2 == 0
+
+    # Tasks of a queue are indistinguishable: the k-th load is not before the k-th arrival
+    assert loads.keys() == arrivals.keys()
+    for qnumber, timestamps in arrivals.items():
+        assert len(loads[qnumber]) == len(timestamps)
+        assert all(start >= arrival for start, arrival in zip(sorted(loads[qnumber]), timestamps))
+
+    assert sum(busy) == sum(ip.work_times[qnumber] for _, qnumber in ip.arrivals) + changes
+    assert solver.results()["servers_utilisation"] == pytest.approx([elem / solver.results()["time"] for elem in busy])
+
+
+# Results of the Solver before several servers were supported
+ONE_SERVER_BASELINE = {
+    (False, "MSmart"): (6834, [2.8086040386303774, 4.300995024875622, 3.9615159496634473, 14.053702077846063], 259),
+    (False, "MBrainLike"): (10059, [215.2268615170494, 6.105775922059847, 73.59310070583557, 24.443384034198232], 1095),
+    (True, "MSmart"): (6825, [2.9113553113553112, 4.150476190476191, 4.189157509157509, 13.437948717948718], 254),
+    (True, "MBrainLike"): (11249, [87.75295581829496, 290.19690639167925, 0.36945506267223754, 7.075651168992799], 1475),
+}
+
+
+@pytest.mark.parametrize("crowded, algo_name", ONE_SERVER_BASELINE.keys())
+def test_one_server_matches_baseline(crowded, algo_name):
+    ip = crowded_input() if crowded else SyntheticInput(2000, 4, 0)
+    random.seed(0)
+    solver = Solver(ip, METHODS[algo_name](ip), keep_distrib=False)
+    solver.simulate()
+    results = solver.results()
+    assert (results["time"], results["mean_queues"], results["switches"]) == ONE_SERVER_BASELINE[(crowded, algo_name)]
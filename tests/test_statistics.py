@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from scheduler.benchmarks import SyntheticInput
+from scheduler.events import Event
+from scheduler.methods import METHODS
+from scheduler.solver import Solver
+
+
+def replayed_results(events: list, num_queues: int) -> dict:
+    """
+    Statistics of the processed events of one server, computed after the run.
+    max_queues counts all arrivals of a timestamp before its loads
+    """
+    queues = [0] * num_queues
+    area = [0] * num_queues
+    max_queues = [0] * num_queues
+    busy, switches, last_timestamp, loaded_at = 0, 0, 0, 0
+    for ev in sorted(events):
+        area = [elem + count * (ev.timestamp - last_timestamp) for elem, count in zip(area, queues)]
+        last_timestamp = ev.timestamp
+        if ev.type == Event.ARRIVE:
+            queues[ev.qnumber] += 1
+            max_queues[ev.qnumber] = max(max_queues[ev.qnumber], queues[ev.qnumber])
+        elif ev.type in (Event.LOAD, Event.LOAD_CH):
+            queues[ev.qnumber] -= 1
+            switches += ev.type == Event.LOAD_CH
+            loaded_at = ev.timestamp
+        elif ev.type == Event.UNLOAD:
+            busy += ev.timestamp - loaded_at
+    return {
+        "time": last_timestamp,
+        "mean_queues": [elem / last_timestamp for elem in area],
+        "max_queues": max_queues,
+        "utilisation": busy / last_timestamp,
+        "switches": switches,
+    }
+
+
+@pytest.mark.parametrize("algo_name", ["MRandom", "MSmart", "MBrainLike"])
+@pytest.mark.parametrize("seed", range(2))
+def test_accumulators_equal_replay(algo_name, seed):
+    ip = SyntheticInput(2000, 4, seed)
+    random.seed(seed)
+    solver = Solver(ip, METHODS[algo_name](ip))
+    solver.events_.keep_done_ = True
+    solver.simulate()
+    results = solver.results()
+    results.pop("queues_distrib")
+
+    expected = replayed_results(solver.events_.done_events_, 4)
+    max_queues = results.pop("max_queues")
+    assert results.keys() == expected.keys() - {"max_queues"}
+    for name, value in results.items():
+        assert value == pytest.approx(expected[name])
+
+    # Queue lengths before the events of each timestamp, as the old post-hoc replay
+    old_distrib = solver.events_.queues_distrib()
+    assert [sum(elem) / results["time"] for elem in zip(*old_distrib)] == pytest.approx(results["mean_queues"])
+    # The calendar processes loads at a timestamp after all its arrivals, while
+    # the Solver loads a task as soon as it arrives to a free server
+    for qnumber, elem in enumerate(max_queues):
+        assert max(counts[qnumber] for counts in old_distrib) <= elem <= expected["max_queues"][qnumber]